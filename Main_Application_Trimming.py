@@ -5,16 +5,24 @@ import json
 import pandas as pd
 from datetime import datetime
 import multiprocessing
-import threading
 from flask import Flask, request, jsonify, render_template_string
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-from parallel_trimming import run_parallel_trimming, process_substance
+from parallel_trimming import run_parallel_trimming, ensure_trimming_plan_columns, apply_production
 from trimming_state import trimming_state
+from solve_queue import SolveQueue
+from trimming_pool import solve_pool
 import atexit
 
 app = Flask(__name__, static_folder='static', static_url_path='/static')
 
+# Seconds the hourly batch may take, so it and the export finish before the next trigger
+BATCH_DEADLINE_SECONDS = 30 * 60
+
+# Request-triggered solves: a burst of edits to one substance becomes a single solve, which runs
+# on the shared worker pool so the web process only waits for it
+solve_queue = SolveQueue(solve_pool.solve, debounce=2.0)
+
 HOME_TEMPLATE = """
 <!DOCTYPE html>
 <html>
@@ -344,6 +352,15 @@ def create_tables():
                   weight_final REAL,
                   detail_trim_PM1_PM2 TEXT,
                   cut_1_final INTEGER,
+                  engine TEXT,
+                  engine_reason TEXT,
+                  solve_seconds REAL,
+                  partial INTEGER,
+                  iterations INTEGER,
+                  fingerprint TEXT,
+                  lower_bound REAL,
+                  gap REAL,
+                  truncated INTEGER,
                   FOREIGN KEY (substance_id) REFERENCES substances(id))''')
 
     c.execute('''CREATE INDEX IF NOT EXISTS idx_trimming_plan_substance 
@@ -578,8 +595,10 @@ def new_order():
         if not orders:
             return jsonify({"status": "error", "message": "No orders provided"}), 400
 
-        # Stop any current processing for this substance
-        trimming_state.stop_processing(substance_id)
+        try:
+            substance_id = int(substance_id)
+        except (TypeError, ValueError):
+            return jsonify({"status": "error", "message": "Invalid substance ID"}), 400
 
         with sqlite3.connect('trimming_system.db', timeout=30) as conn:
             c = conn.cursor()
@@ -591,6 +610,9 @@ def new_order():
                 if not substance:
                     return jsonify({"status": "error", "message": "Invalid substance ID"}), 400
 
+                # Stop any current processing for this substance
+                trimming_state.stop_processing(substance_id)
+
                 # Process orders in transaction
                 for order in orders:
                     ukuran = int(order['ukuran'])
@@ -621,13 +643,8 @@ def new_order():
                 details = json.dumps({'orders': orders}, indent=2)
                 log_operation('New Order', substance[0], details, f"Added {len(orders)} new orders")
 
-                # Start new calculation in background
-                thread = threading.Thread(
-                    target=process_substance,
-                    args=(substance_id,)
-                )
-                thread.daemon = True
-                thread.start()
+                # Queue a new calculation in background
+                solve_queue.submit(substance_id)
 
                 return jsonify({
                     "status": "success",
@@ -663,9 +680,6 @@ def production_update():
                 "message": "Missing required fields"
             }), 400
 
-        # Stop any current processing for this substance
-        trimming_state.stop_processing(substance_id)
-
         with sqlite3.connect('trimming_system.db', timeout=30) as conn:
             c = conn.cursor()
 
@@ -678,6 +692,9 @@ def production_update():
                         "message": "Invalid substance ID"
                     }), 400
 
+                # Stop any current processing for this substance
+                trimming_state.stop_processing(substance_id)
+
                 # Verify quantities
                 widths = [(ukuran1, "Width 1"), (ukuran2, "Width 2")]
                 if ukuran3:
@@ -717,6 +734,10 @@ def production_update():
                     WHERE quantity <= 0 AND substance_id = ?
                 """, (substance_id,))
 
+                # The operator usually ran a pattern of the stored plan: take its cuts off the plan
+                # in place, and solve again only when the production does not match the plan
+                plan_updated = apply_production(conn, substance_id, [w for w, _ in widths], quantity)
+
                 conn.commit()
 
                 # Log operation
@@ -727,13 +748,14 @@ def production_update():
                 log_operation('Production Update', substance[0], details,
                               f"Updated production quantities for {len(widths)} widths")
 
-                # Start new calculation in background
-                thread = threading.Thread(
-                    target=process_substance,
-                    args=(substance_id,)
-                )
-                thread.daemon = True
-                thread.start()
+                if plan_updated:
+                    return jsonify({
+                        "status": "success",
+                        "message": "Production updated successfully and trimming plan adjusted"
+                    }), 200
+
+                # Queue a new calculation in background
+                solve_queue.submit(substance_id)
 
                 return jsonify({
                     "status": "success",
@@ -860,7 +882,7 @@ def periodic_update():
         trimming_state.stop_all_processing()
 
         # Run parallel trimming
-        run_parallel_trimming()
+        run_parallel_trimming(pool=solve_pool, deadline=BATCH_DEADLINE_SECONDS)
 
         # Export data to Excel
         exported_file = export_data_to_excel()
@@ -887,9 +909,22 @@ if __name__ == '__main__':
         print("New database created successfully.")
     else:
         print("Using existing database.")
+        conn = sqlite3.connect('trimming_system.db')
+        ensure_trimming_plan_columns(conn)
+        conn.close()
+
+    # Size the shared cancellation counters before the workers are created, with room for
+    # substances added while the app runs
+    conn = sqlite3.connect('trimming_system.db')
+    max_id = conn.execute("SELECT MAX(id) FROM substances").fetchone()[0] or 0
+    conn.close()
+    trimming_state.reserve(2 * (max_id + 1))
+
+    # Start the long-lived solve workers once; every batch and queued solve reuses them
+    solve_pool.start()
 
     # Initial run
-    run_parallel_trimming()
+    run_parallel_trimming(pool=solve_pool, deadline=BATCH_DEADLINE_SECONDS)
 
     # Set up scheduler
     scheduler = BackgroundScheduler()
@@ -906,6 +941,8 @@ if __name__ == '__main__':
 
     # Register shutdown handler
     atexit.register(lambda: scheduler.shutdown())
+    atexit.register(solve_queue.shutdown)
+    atexit.register(solve_pool.close)
 
     # Run in production mode
     app.run(debug=False, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,76 @@
+import threading
+import time
+import timeit
+
+import numpy as np
+from trimming_random import trimming_random
+from trimming_state import trimming_state
+
+# Synthetic order book, so the benchmark does not depend on the database contents
+UKURAN = np.array([95, 100, 105, 110, 120, 125, 135, 145, 150, 155, 160, 170, 180, 200, 210])
+ORDER = np.array([60, 70, 80, 90, 50, 30, 40, 100, 100, 100, 40, 30, 50, 40, 30])
+SUBSTANCE_ID = 1
+
+
+class _LockedState:
+    """The lock-per-call check trimming_random used to run on every inner step, kept for comparison"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._processing_substances = {SUBSTANCE_ID}
+        self._periodic_update_running = False
+
+    def interrupted(self, substance_id):
+        with self._lock:
+            processing = substance_id in self._processing_substances
+        with self._lock:
+            return not processing or self._periodic_update_running
+
+
+def bench_checks(calls=1000000):
+    """Cost of one cancellation check, in nanoseconds"""
+    locked = _LockedState()
+    trimming_state.start_processing(SUBSTANCE_ID)
+    token = trimming_state.cancellation_token(SUBSTANCE_ID)
+    checks = {
+        'lock per call (old)': lambda: locked.interrupted(SUBSTANCE_ID),
+        'TrimmingState.is_cancelled': lambda: trimming_state.is_cancelled(SUBSTANCE_ID),
+        'CancellationToken.cancelled': token.cancelled,
+    }
+    for name, check in checks.items():
+        seconds = min(timeit.repeat(check, number=calls, repeat=3))
+        print(f"{name:30s} {seconds / calls * 1e9:8.1f} ns per check")
+
+
+def bench_iterations(iterations=500):
+    """Wall-clock time of one trimming_random iteration (4 phases of up to 1000 draws)"""
+    trimming_state.start_processing(SUBSTANCE_ID)
+    started = time.perf_counter()
+    trimming_random(ORDER, UKURAN, 312, 312, 312, SUBSTANCE_ID, seed=1, iterations=iterations,
+                    checkpoint_interval=iterations + 1, local_search_budget=0)
+    seconds = time.perf_counter() - started
+    print(f"trimming_random                {seconds / iterations * 1e3:8.3f} ms per iteration")
+
+
+def bench_latency(delay=1.0):
+    """Time from stop_processing to trimming_random returning"""
+    trimming_state.start_processing(SUBSTANCE_ID)
+    finished = {}
+
+    def run():
+        trimming_random(ORDER, UKURAN, 312, 312, 312, SUBSTANCE_ID, seed=1, local_search_budget=0)
+        finished['at'] = time.perf_counter()
+
+    worker = threading.Thread(target=run)
+    worker.start()
+    time.sleep(delay)
+    stopped = time.perf_counter()
+    trimming_state.stop_processing(SUBSTANCE_ID)
+    worker.join()
+    print(f"cancellation latency           {(finished['at'] - stopped) * 1e3:8.3f} ms")
+
+
+if __name__ == '__main__':
+    bench_checks()
+    bench_iterations()
+    bench_latency()
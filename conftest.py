@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from trimming_exact import milp
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "needs_scipy: the exact MILP engine is the reference, so the test needs scipy")
+
+
+def pytest_collection_modifyitems(config, items):
+    if milp is not None:
+        return
+    skip = pytest.mark.skip(reason="scipy is not installed")
+    for item in items:
+        if item.get_closest_marker('needs_scipy'):
+            item.add_marker(skip)
+
+
+@pytest.fixture
+def random_books():
+    """
+        Generator of `count` random order books: from `widths[0]` to `widths[1]` - 1 distinct widths
+        drawn from the range `sizes` (inclusive), each ordered from 1 to `max_quantity` rolls
+    """
+    def books(count, seed, widths, sizes, max_quantity):
+        rng = np.random.default_rng(seed)
+        for _ in range(count):
+            width_count = rng.integers(*widths)
+            ukuran = np.sort(rng.choice(np.arange(sizes[0], sizes[1] + 1), size=width_count, replace=False))
+            yield ukuran, rng.integers(1, max_quantity + 1, size=width_count)
+    return books
@@ -2,13 +2,134 @@ import multiprocessing
 import sqlite3
 import numpy as np
 import json
+import hashlib
+import time
 from datetime import datetime
-from trimming_random import trimming_random
-from trimming_state import trimming_state
+from trimming_bound import BOUND_TOLERANCE, lower_bound
+from trimming_engines import (ANYTIME_ENGINES, BOUNDED_ENGINES, DEFAULT_ENGINE, ENGINES, SPLITTABLE_ENGINES,
+                              SUBSTANCE_ENGINES, TIME_BUDGET_OPTIONS, WARM_STARTED_ENGINES, select_engine)
+from trimming_greedy import carry_over_plan
+from trimming_matching import trimming_matching, two_out_only
+from trimming_patterns import better_result, detail_plan, plan_result
+from trimming_state import attach_shared_state, trimming_state
 
+# Columns added to trimming_plan after its first release, with their types
+TRIMMING_PLAN_COLUMNS = [
+    ('engine', 'TEXT'),
+    ('engine_reason', 'TEXT'),
+    ('solve_seconds', 'REAL'),
+    ('partial', 'INTEGER'),
+    ('iterations', 'INTEGER'),
+    ('fingerprint', 'TEXT'),
+    ('lower_bound', 'REAL'),
+    ('gap', 'REAL'),
+    ('truncated', 'INTEGER'),
+]
 
-def store_trimming_results(conn, substance_id, result):
-    """Store trimming calculation results in database"""
+# Widths of the three machine positions (PM1, PM2, PM3) every order book is trimmed for
+MACHINE_WIDTHS = (312, 312, 312)
+
+
+# Connection kept open for the life of a pool worker, see open_worker_connection
+_worker_conn = None
+
+
+def open_worker_connection():
+    """Pool initializer step: give this worker one SQLite connection for all its tasks"""
+    global _worker_conn
+    _worker_conn = sqlite3.connect('trimming_system.db', timeout=30)
+
+
+def ensure_trimming_plan_columns(conn):
+    """Add any trimming_plan columns missing from an older database"""
+    c = conn.cursor()
+    c.execute("PRAGMA table_info(trimming_plan)")
+    existing = {row[1] for row in c.fetchall()}
+    for name, column_type in TRIMMING_PLAN_COLUMNS:
+        if name not in existing:
+            c.execute(f"ALTER TABLE trimming_plan ADD COLUMN {name} {column_type}")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_trimming_plan_fingerprint ON trimming_plan(fingerprint)")
+    conn.commit()
+
+
+def order_fingerprint(ukuran, order, engine, lebar):
+    """
+        Canonical hash of a solve's inputs: the (ukuran, quantity) order book, the configured
+        engine and the machine widths `lebar`. The substance itself is left out, so identical
+        order books of different substances share a fingerprint
+    """
+    key = {
+        'orders': [[int(u), int(q)] for u, q in sorted(zip(ukuran, order)) if q > 0],
+        'engine': engine,
+        'lebar': [int(l) for l in lebar],
+    }
+    return hashlib.sha256(json.dumps(key, separators=(',', ':')).encode()).hexdigest()
+
+
+def reuse_stored_plan(conn, substance_id, fingerprint, final_only=True):
+    """
+        Keep or copy a final stored plan solved for the same fingerprint, instead of solving.
+        A plan is final when its search ran to the end, or stopped on its time budget at the lower
+        bound; a partial or budget-truncated plan is re-solved, warm-started from itself.
+        Without `final_only` the lightest plan of the fingerprint is taken, flags included, so the
+        substance at least holds the best plan of its own order book.
+        Final plans, then the substance's own plan, win ties; otherwise another substance's plan is copied.
+        Returns False when no such plan exists
+    """
+    c = conn.cursor()
+    c.execute("""
+        SELECT substance_id FROM trimming_plan
+        WHERE fingerprint = ?
+          AND (? = 0 OR (COALESCE(partial, 0) = 0 AND (COALESCE(truncated, 0) = 0 OR gap <= ?)))
+        ORDER BY (? = 0) * weight_final, COALESCE(partial, 0) + COALESCE(truncated, 0), substance_id = ? DESC
+        LIMIT 1
+    """, (fingerprint, int(final_only), BOUND_TOLERANCE, int(final_only), substance_id))
+    source = c.fetchone()
+    if source is None:
+        return False
+    if source[0] == substance_id:
+        print(f"Substance {substance_id} is unchanged since its last plan, skipping")
+        return True
+
+    c.execute("DELETE FROM trimming_plan WHERE substance_id = ?", (substance_id,))
+    c.execute("""
+        INSERT INTO trimming_plan
+        (substance_id, ukuran_finaltrim_sisaorder, weight_final,
+         detail_trim_PM1_PM2, cut_1_final, engine, engine_reason, solve_seconds,
+         partial, iterations, fingerprint, lower_bound, gap, truncated)
+        SELECT ?, ukuran_finaltrim_sisaorder, weight_final,
+               detail_trim_PM1_PM2, cut_1_final, engine, ?, solve_seconds,
+               partial, iterations, fingerprint, lower_bound, gap, truncated
+        FROM trimming_plan WHERE substance_id = ?
+    """, (substance_id, f"plan of substance {source[0]}, which has the same order book", source[0]))
+    conn.commit()
+    print(f"Substance {substance_id} reuses the plan of substance {source[0]}: identical order book")
+    return True
+
+
+def substance_fingerprint(conn, substance_id):
+    """order_fingerprint of a substance's current order book and configured engine, or None without orders"""
+    c = conn.cursor()
+    c.execute("SELECT ukuran, quantity FROM orders WHERE substance_id = ? ORDER BY ukuran ASC", (substance_id,))
+    orders = c.fetchall()
+    if not orders:
+        return None
+    ukuran, order = zip(*orders)
+    return order_fingerprint(ukuran, order, substance_engine(conn, substance_id), MACHINE_WIDTHS)
+
+
+def last_solve(conn, substance_id):
+    """(engine, solve_seconds) of the stored plan of a substance, or None"""
+    c = conn.cursor()
+    c.execute("SELECT engine, solve_seconds FROM trimming_plan WHERE substance_id = ?", (substance_id,))
+    return c.fetchone()
+
+
+def store_trimming_results(conn, substance_id, result, info=None):
+    """
+        Store trimming calculation results in database, with the engine details in `info`;
+        the gap is stored as the tonnes between the plan's weight and info['lower_bound']
+    """
     c = conn.cursor()
 
     ukuran_finaltrim_json = json.dumps(result[0].tolist())
@@ -16,29 +137,229 @@ def store_trimming_results(conn, substance_id, result):
 
     c.execute("DELETE FROM trimming_plan WHERE substance_id = ?", (substance_id,))
 
+    info = info or {}
+    bound = info.get('lower_bound')
     c.execute("""
         INSERT INTO trimming_plan 
         (substance_id, ukuran_finaltrim_sisaorder, weight_final, 
-         detail_trim_PM1_PM2, cut_1_final)
-        VALUES (?, ?, ?, ?, ?)
+         detail_trim_PM1_PM2, cut_1_final, engine, engine_reason, solve_seconds,
+         partial, iterations, fingerprint, lower_bound, gap, truncated)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """, (
         substance_id,
         ukuran_finaltrim_json,
         float(result[1]),
         detail_trim_json,
-        int(result[3])
+        int(result[3]),
+        info.get('engine'),
+        info.get('engine_reason'),
+        info.get('solve_seconds'),
+        int(bool(info.get('partial'))),
+        info.get('iterations'),
+        info.get('fingerprint'),
+        bound,
+        max(0.0, float(result[1]) - bound) if bound is not None else None,
+        int(bool(info.get('truncated')))
     ))
     conn.commit()
 
 
-def process_substance(substance_id):
-    """Process a single substance with interrupt handling"""
+def substance_engine(conn, substance_id):
+    """Engine configured for a substance: its SUBSTANCE_ENGINES entry, else DEFAULT_ENGINE"""
+    c = conn.cursor()
+    c.execute("SELECT name FROM substances WHERE id = ?", (substance_id,))
+    substance = c.fetchone()
+    return SUBSTANCE_ENGINES.get(substance[0] if substance else None, DEFAULT_ENGINE)
+
+
+def stored_order_book(ukuran_finaltrim_json):
+    """
+        (ukuran, order) a stored plan was solved for, read from its ukuran_finaltrim_sisaorder JSON:
+        the order book is the plan's widths with the rolls cut plus the rolls left over
+    """
+    rows = np.array(json.loads(ukuran_finaltrim_json), dtype=float).reshape(-1, 6)
+    return rows[:, 0].astype(int), (rows[:, 4] + rows[:, 5]).astype(int)
+
+
+def apply_production(conn, substance_id, widths, quantity):
+    """
+        Update the stored plan of a substance after `quantity` cuts of the pattern `widths` were
+        produced, by taking them off the plan rows of that pattern; call it once the orders table
+        has been decremented. The leftover rolls do not change, so the plan stays as good as it was.
+        Returns False, leaving the plan alone, when the stored plan was not solved for the order book
+        before this production or holds fewer cuts of the pattern; the substance then needs a solve
+    """
+    c = conn.cursor()
+    c.execute("""
+        SELECT ukuran_finaltrim_sisaorder, detail_trim_PM1_PM2, engine, engine_reason,
+               solve_seconds, partial, iterations, lower_bound, truncated
+        FROM trimming_plan WHERE substance_id = ?
+    """, (substance_id,))
+    stored = c.fetchone()
+    if stored is None or not stored[0] or not stored[1]:
+        return False
+    ukuran, order = stored_order_book(stored[0])
+    index_of = {width: i for i, width in enumerate(ukuran.tolist())}
+    if any(width not in index_of for width in widths):
+        return False
+
+    # The stored order book less this production must be the order book now
+    for width in widths:
+        order[index_of[width]] -= quantity
+    c.execute("SELECT ukuran, quantity FROM orders WHERE substance_id = ? ORDER BY ukuran ASC", (substance_id,))
+    if order.min(initial=0) < 0 or \
+            c.fetchall() != [(u, q) for u, q in zip(ukuran.tolist(), order.tolist()) if q > 0]:
+        return False
+
+    try:
+        plan = detail_plan(json.loads(stored[1]), ukuran, MACHINE_WIDTHS[0])
+    except KeyError:
+        return False
+    pattern = tuple(sorted(index_of[width] for width in widths))
+    remaining = quantity
+    adjusted = []
+    for machine, indices, count in plan:
+        if indices == pattern and remaining > 0:
+            taken = min(count, remaining)
+            remaining -= taken
+            count -= taken
+        adjusted.append((machine, indices, count))
+    if remaining > 0:
+        return False
+
+    # Widths produced to zero have left the orders table, so they leave the plan too. The old bound
+    # still holds: any plan of the new orders plus the produced cuts is a plan of the old ones
+    a, weight, detail, cut_1 = plan_result(order, ukuran, adjusted)
+    keep = order > 0
+    info = {'engine': stored[2], 'engine_reason': stored[3], 'solve_seconds': stored[4],
+            'partial': stored[5], 'iterations': stored[6], 'lower_bound': stored[7], 'truncated': stored[8],
+            'fingerprint': order_fingerprint(ukuran[keep], order[keep], substance_engine(conn, substance_id),
+                                             MACHINE_WIDTHS)}
+    store_trimming_results(conn, substance_id, (a[keep], weight, detail, cut_1), info)
+    print(f"Plan of substance {substance_id} updated for {quantity} produced cuts of {sorted(widths)}")
+    return True
+
+
+def plan_worth_storing(conn, substance_id, ukuran, order, weight, replace_equal=False):
+    """
+        Whether the plan of an interrupted calculation or of one chain of a split substance is worth
+        storing: only while the order book is still the one it was solved for, and the stored plan
+        is for other orders or heavier (or as heavy, with `replace_equal`)
+    """
+    c = conn.cursor()
+    c.execute("SELECT ukuran, quantity FROM orders WHERE substance_id = ? ORDER BY ukuran ASC", (substance_id,))
+    if c.fetchall() != list(zip(ukuran.tolist(), order.tolist())):
+        return False
+
+    c.execute("SELECT ukuran_finaltrim_sisaorder, weight_final FROM trimming_plan WHERE substance_id = ?",
+              (substance_id,))
+    stored = c.fetchone()
+    if stored is None or not stored[0]:
+        return True
+    stored_ukuran, stored_order = stored_order_book(stored[0])
+    if not np.array_equal(stored_ukuran, ukuran) or not np.array_equal(stored_order, order):
+        return True
+    return weight < stored[1] or (replace_equal and weight == stored[1])
+
+
+def previous_plan(conn, substance_id):
+    """
+        The stored plan of a substance as (ukuran, order, detail rows, partial, truncated, weight),
+        where `order` is the order book it was solved for, or None when there is none
+    """
+    c = conn.cursor()
+    c.execute("SELECT ukuran_finaltrim_sisaorder, detail_trim_PM1_PM2, partial, truncated, weight_final "
+              "FROM trimming_plan WHERE substance_id = ?", (substance_id,))
+    stored = c.fetchone()
+    if stored is None or not stored[0]:
+        return None
+    ukuran, order = stored_order_book(stored[0])
+    return ukuran, order, json.loads(stored[1] or '[]'), bool(stored[2]), bool(stored[3]), stored[4]
+
+
+def changed_rolls(ukuran_before, order_before, ukuran, order):
+    """Rolls added or removed between two order books, summed over the widths of both"""
+    before = dict(zip(np.asarray(ukuran_before).tolist(), np.asarray(order_before).tolist()))
+    after = dict(zip(np.asarray(ukuran).tolist(), np.asarray(order).tolist()))
+    return sum(abs(after.get(width, 0) - before.get(width, 0)) for width in set(before) | set(after))
+
+
+# Search budget of a re-solve warm-started from a complete stored plan: a base plus a share per
+# roll added or removed since, so re-solve time follows the size of the order edit. A plan cut
+# short by its time budget gets the base alone to carry on from where it stopped; a carry-on
+# that finds nothing lighter marks the plan final, so the unchanged book is skipped from then on
+REPLAN_BASE_SECONDS = 2.0
+REPLAN_SECONDS_PER_ROLL = 0.02
+
+
+# Share of a batch deadline held back for the export and scheduling slack
+BATCH_DEADLINE_MARGIN = 0.2
+
+# Estimated solve seconds per width-roll product, for substances without a measured solve time
+SECONDS_PER_WIDTH_ROLL = 1e-4
+
+
+def estimate_cost(widths, quantity, last_seconds=None):
+    """Expected solve seconds of a substance: its last measured solve time, else a size-based guess"""
+    if last_seconds is not None:
+        return last_seconds
+    return widths * quantity * SECONDS_PER_WIDTH_ROLL
+
+
+def substance_budgets(substances, deadline, processes, split=()):
+    """
+        Split a batch deadline (seconds) into per-substance solver budgets.
+        `substances` maps substance_id to (widths, quantity, leftover weight of the stored plan).
+        Substances get a share of the worker time in proportion to widths * (1 + leftover weight),
+        so big order books with much waste left get the most; 20% is held back as a margin, and
+        no budget exceeds the margin-adjusted deadline itself.
+        Substances in `split` search on all `processes` at once, so their share is spread over them.
+    """
+    usable = deadline * (1 - BATCH_DEADLINE_MARGIN)
+    shares = {substance_id: widths * (1 + (leftover or 0))
+              for substance_id, (widths, quantity, leftover) in substances.items()}
+    total = sum(shares.values()) or 1
+    return {substance_id: min(usable, usable * (1 if substance_id in split else processes) * share / total)
+            for substance_id, share in shares.items()}
+
+
+def process_job(job):
+    """Run process_substance for one (substance_id, options) batch job"""
+    substance_id, options = job
+    return process_substance(substance_id, **options)
+
+
+def process_substance(substance_id, seed=None, engine=None, workers=1, batch=False, anytime=True,
+                      time_budget=None, deadline=None, reuse=True, keep_best=False):
+    """
+        Process a single substance with interrupt handling; pass `seed` to reproduce a plan
+        `workers` > 1 splits a random-engine search across that many processes
+        `batch` marks a run of the periodic batch, which the periodic update flag does not cancel
+        With `anytime` an interrupted search still stores its best plan so far, marked partial,
+        when plan_worth_storing allows it
+        `time_budget` caps the solver's wall-clock seconds, and is cut short to end by `deadline`
+        (a time.time() value); a substance that starts after its deadline is skipped
+        With `reuse` an order book whose fingerprint matches a final stored plan is not solved:
+        the substance keeps its own plan, or copies the plan of a substance with the same orders
+        With `keep_best` the plan is only stored when no lighter plan of the order book is stored,
+        so the concurrent chains of a split substance leave the best of their plans
+    """
     print(f"Starting calculation for substance {substance_id} at {datetime.now()}")
+    if deadline is not None:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            print(f"Skipping substance {substance_id}: the batch deadline has passed")
+            return
+        time_budget = remaining if time_budget is None else min(time_budget, remaining)
 
-    # Mark substance as being processed
-    trimming_state.start_processing(substance_id)
+    # Mark substance as being processed; an id the shared state cannot track fails this job only
+    try:
+        token = trimming_state.start_processing(substance_id, batch=batch)
+    except ValueError as e:
+        print(f"Error processing substance {substance_id}: {e}")
+        return
 
-    conn = sqlite3.connect('trimming_system.db')
+    conn = _worker_conn or sqlite3.connect('trimming_system.db')
 
     try:
         c = conn.cursor()
@@ -58,52 +379,213 @@ def process_substance(substance_id):
 
         ukuran = np.array([order[0] for order in orders])
         order = np.array([order[1] for order in orders])
-        lebar_1, lebar_2, lebar_3 = 312, 312, 312
+        lebar_1, lebar_2, lebar_3 = MACHINE_WIDTHS
+
+        if engine is not None:
+            reason = "requested by the caller"
+        else:
+            engine = substance_engine(conn, substance_id)
+            reason = "configured for the substance"
+        fingerprint = order_fingerprint(ukuran, order, engine, (lebar_1, lebar_2, lebar_3))
+        if reuse and reuse_stored_plan(conn, substance_id, fingerprint):
+            return
+        if engine == 'auto':
+            engine, reason = select_engine(order, ukuran, lebar_1, lebar_2, lebar_3,
+                                           history=last_solve(conn, substance_id))
+        print(f"Substance {substance_id} uses the {engine} engine: {reason}")
+        solver = ENGINES[engine]
+        started = time.perf_counter()
+
+        # The stored plan, carried over to the new orders, warm-starts the search; it then only has
+        # the change in the order book to place, so its budget shrinks with the size of the change
+        previous = previous_plan(conn, substance_id) if engine in WARM_STARTED_ENGINES else None
+        carry_on = False
+        if previous is not None and not previous[3] and engine in TIME_BUDGET_OPTIONS:
+            changed = changed_rolls(previous[0], previous[1], ukuran, order)
+            carry_on = changed == 0 and previous[4]
+            replan_budget = REPLAN_BASE_SECONDS + REPLAN_SECONDS_PER_ROLL * changed
+            if (changed > 0 or previous[4]) and (time_budget is None or replan_budget < time_budget):
+                time_budget = replan_budget
+                if changed > 0:
+                    print(f"Substance {substance_id} re-plans {changed} changed rolls from its stored plan "
+                          f"within {time_budget:.1f}s")
+                else:
+                    print(f"Substance {substance_id} carries on its budget-truncated plan within {time_budget:.1f}s")
 
         # Run calculation with substance_id for interrupt checking
-        result = trimming_random(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id)
+        solve_info = {}
+        options = {'anytime': anytime, 'info': solve_info} if engine in ANYTIME_ENGINES else {}
+        if engine in TIME_BUDGET_OPTIONS:
+            # Engines with a budget mark info['truncated'] when it, not the search, ended the solve
+            options['info'] = solve_info
+        if engine == 'random':
+            options['workers'] = workers
+        if time_budget is not None and engine in TIME_BUDGET_OPTIONS:
+            options[TIME_BUDGET_OPTIONS[engine]] = time_budget
+        # A search whose best plan reaches the lower bound is optimal and stops there
+        bound = lower_bound(order, ukuran, lebar_1, lebar_2, lebar_3)
+        if engine in BOUNDED_ENGINES:
+            options['lower_bound'] = bound
+        if engine in WARM_STARTED_ENGINES:
+            # The exact 2-out plan seeds the search, or the carried-over stored plan when that is
+            # better; when no 3-out pattern fits, the 2-out plan is the answer
+            pairing_info = {}
+            warm_start = trimming_matching(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id, info=pairing_info)
+            if pairing_info.get('optimal') and two_out_only(ukuran, lebar_1, lebar_3):
+                result = warm_start
+            else:
+                if previous is not None:
+                    warm_start = better_result(warm_start, carry_over_plan(previous[2], ukuran, order,
+                                                                           lebar_1, lebar_2, lebar_3))
+                result = solver(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id, seed=seed,
+                                warm_start=warm_start, **options)
+        else:
+            result = solver(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id, seed=seed, **options)
 
-        if result[0] is not None:
-            store_trimming_results(conn, substance_id, result)
-            print(f"Calculation completed for substance {substance_id} at {datetime.now()}")
+        partial = solve_info.get('partial', False)
+        truncated = solve_info.get('truncated', False)
+        if carry_on and truncated and result[0] is not None and result[1] >= previous[5] - BOUND_TOLERANCE:
+            print(f"Substance {substance_id}: carrying on did not improve its plan, marking it final")
+            truncated = False
+        if result[0] is not None and (partial or keep_best):
+            # Checked and stored in one write transaction, so concurrent chains cannot interleave
+            conn.execute("BEGIN IMMEDIATE")
+        if result[0] is not None and (partial or keep_best) and not plan_worth_storing(
+                conn, substance_id, ukuran, order, result[1], replace_equal=keep_best and not partial):
+            conn.rollback()
+            print(f"Discarding the {'partial ' if partial else ''}plan for substance {substance_id}: "
+                  f"its orders changed or a better plan is stored")
+        elif result[0] is not None:
+            info = {'engine': engine, 'engine_reason': reason, 'solve_seconds': time.perf_counter() - started,
+                    'partial': partial, 'iterations': solve_info.get('iterations'), 'fingerprint': fingerprint,
+                    'lower_bound': bound, 'truncated': truncated}
+            store_trimming_results(conn, substance_id, result, info)
+            print(f"Substance {substance_id}: weight {result[1]:.4f}, lower bound {bound:.4f}, "
+                  f"gap {max(0.0, result[1] - bound):.4f} tonnes")
+            if partial:
+                print(f"Partial plan stored for substance {substance_id} after "
+                      f"{solve_info.get('iterations')} iterations at {datetime.now()}")
+            else:
+                print(f"Calculation completed for substance {substance_id} at {datetime.now()}")
 
     except Exception as e:
         print(f"Error processing substance {substance_id}: {e}")
         if conn:
             conn.rollback()
     finally:
-        if conn:
+        if conn and conn is not _worker_conn:
             conn.close()
-        # Clear processing state
-        trimming_state.stop_processing(substance_id)
+        # Clear processing state, leaving a newer calculation of the substance running
+        trimming_state.finish_processing(substance_id, token)
 
 
-def run_parallel_trimming():
-    """Run trimming calculations for all substances in parallel"""
+def run_parallel_trimming(pool=None, deadline=None):
+    """
+        Run trimming calculations for all substances in parallel
+        Pass a SolvePool to run them on its long-lived workers instead of a pool of its own
+        With `deadline` (seconds) every substance gets a solver budget from substance_budgets and
+        the batch as a whole stops starting or running solves once the deadline is reached
+    """
     conn = sqlite3.connect('trimming_system.db')
     c = conn.cursor()
 
     try:
-        # Get all substances with orders
+        ensure_trimming_plan_columns(conn)
+        deadline_at = time.time() + deadline if deadline is not None else None
+
+        # Get all substances with orders, with what their cost estimate and budget need
         c.execute("""
-            SELECT DISTINCT s.id
+            SELECT s.id, COUNT(o.id), SUM(o.quantity),
+                   (SELECT tp.solve_seconds FROM trimming_plan tp WHERE tp.substance_id = s.id),
+                   (SELECT tp.weight_final FROM trimming_plan tp WHERE tp.substance_id = s.id),
+                   s.name
             FROM substances s
             INNER JOIN orders o ON s.id = o.substance_id
+            GROUP BY s.id
             ORDER BY s.name
         """)
-        substances = [row[0] for row in c.fetchall()]
+        rows = c.fetchall()
+
+        # Fingerprint every order book: unchanged ones keep their plan, ones matching another
+        # substance's stored plan copy it, and identical ones in this batch are solved once
+        c.execute("SELECT substance_id, ukuran, quantity FROM orders ORDER BY substance_id, ukuran")
+        books = {}
+        for substance_id, ukuran, quantity in c.fetchall():
+            books.setdefault(substance_id, []).append((ukuran, quantity))
+        leaders, followers = {}, {}
+        for row in rows:
+            ukuran, order = zip(*books[row[0]])
+            fingerprint = order_fingerprint(ukuran, order, SUBSTANCE_ENGINES.get(row[5], DEFAULT_ENGINE),
+                                            MACHINE_WIDTHS)
+            if reuse_stored_plan(conn, row[0], fingerprint):
+                continue
+            if fingerprint in leaders:
+                followers[row[0]] = fingerprint
+            else:
+                leaders[fingerprint] = row[0]
+        rows = [row for row in rows if row[0] in leaders.values()]
+        names = {row[0]: row[5] for row in rows}
+        costs = {row[0]: estimate_cost(row[1], row[2], row[3]) for row in rows}
+
+        # Longest first, so no heavy substance starts last and runs on alone
+        substances = sorted(costs, key=lambda substance_id: -costs[substance_id])
 
         if not substances:
-            print("No substances to process")
+            print("No substances to process: every order book is unchanged or shares a stored plan")
             return
+        print(f"{len(substances)} substances to solve, {len(followers)} sharing an order book with one of them")
+
+        cores = pool.processes if pool is not None else multiprocessing.cpu_count()
+
+        # A substance expected to outlast an even share of the whole batch would run on alone at
+        # the end with the other cores idle. With a randomised search engine it is split instead:
+        # one independently seeded chain per core is queued first, and each chain stores its plan
+        # only when no lighter one is stored
+        split = None
+        heaviest = substances[0]
+        if cores > 1 and costs[heaviest] > sum(costs.values()) / cores:
+            ukuran, order = (np.array(column) for column in zip(*books[heaviest]))
+            engine = SUBSTANCE_ENGINES.get(names[heaviest], DEFAULT_ENGINE)
+            if engine == 'auto':
+                engine, _ = select_engine(order, ukuran, *MACHINE_WIDTHS, history=last_solve(conn, heaviest))
+            if engine in SPLITTABLE_ENGINES:
+                split = heaviest
+
+        budgets = {}
+        if deadline is not None:
+            budgets = substance_budgets({row[0]: (row[1], row[2], row[4]) for row in rows}, deadline, cores,
+                                        split=(split,))
+        jobs = [(substance_id, {'batch': True, 'time_budget': budgets.get(substance_id), 'deadline': deadline_at})
+                for substance_id in substances]
+        if split is not None:
+            print(f"Substance {split} dominates the batch: splitting its search into {cores} chains")
+            jobs[:1] = [(split, dict(jobs[0][1], keep_best=True)) for _ in range(cores)]
+        num_processes = min(len(jobs), cores)
+
+        if pool is not None:
+            print("Starting parallel processing on the shared solve pool")
+            pool.solve_all(jobs)
+        else:
+            # Create a pool of workers
+            print(f"Starting parallel processing with {num_processes} processes")
 
-        # Create a pool of workers
-        num_processes = min(len(substances), multiprocessing.cpu_count())
-        print(f"Starting parallel processing with {num_processes} processes")
+            # Create and start processes; the workers share the app's cancellation flags and
+            # take one substance at a time, in the order given
+            with multiprocessing.Pool(processes=num_processes, initializer=attach_shared_state,
+                                      initargs=trimming_state.shared()) as pool:
+                for _ in pool.imap_unordered(process_job, jobs, chunksize=1):
+                    pass
 
-        # Create and start processes
-        with multiprocessing.Pool(processes=num_processes) as pool:
-            pool.map(process_substance, substances)
+        # A follower takes whatever plan its leader stored, partial or truncated ones too, since
+        # its own stored plan was solved for another order book; the flags get both re-solved later
+        for substance_id, fingerprint in followers.items():
+            if substance_fingerprint(conn, substance_id) != fingerprint:
+                print(f"Orders of substance {substance_id} changed during the batch; its own solve covers them")
+            elif not reuse_stored_plan(conn, substance_id, fingerprint, final_only=False):
+                print(f"No plan of its order book to share with substance {substance_id}; "
+                      f"dropping its plan for other orders")
+                c.execute("DELETE FROM trimming_plan WHERE substance_id = ?", (substance_id,))
+                conn.commit()
 
         print("All substance calculations completed")
 
@@ -0,0 +1,81 @@
+import threading
+
+
+class SolveQueue:
+    """
+        Request-triggered solves keyed by substance_id, with at most one pending and one running
+        job per substance. A submitted job waits for `debounce` quiet seconds; submissions inside
+        that window restart the wait and coalesce into one solve, which reads the latest order
+        book when it starts. A job that comes due while its substance is still running waits and
+        starts as soon as the running job ends.
+    """
+
+    def __init__(self, solve, debounce=2.0):
+        self._solve = solve
+        self._debounce = debounce
+        self._lock = threading.Lock()
+        self._timers = {}      # substance_id -> debounce timer of its pending job
+        self._running = set()  # substances with a job running
+        self._waiting = set()  # substances whose pending job is due but waits for the running one
+
+    def submit(self, substance_id):
+        """Schedule a solve of a substance after the debounce window, replacing any pending one"""
+        substance_id = int(substance_id)
+        with self._lock:
+            timer = self._timers.pop(substance_id, None)
+            if timer is not None:
+                timer.cancel()
+            self._waiting.discard(substance_id)
+
+            timer = threading.Timer(self._debounce, self._due)
+            # The timer passes itself along, so _due can tell whether it was replaced
+            timer.args = (substance_id, timer)
+            timer.daemon = True
+            self._timers[substance_id] = timer
+            timer.start()
+
+    def pending(self, substance_id):
+        with self._lock:
+            return int(substance_id) in self._timers or int(substance_id) in self._waiting
+
+    def running(self, substance_id):
+        with self._lock:
+            return int(substance_id) in self._running
+
+    def shutdown(self):
+        """Drop every pending job; running jobs finish on their own"""
+        with self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+            self._waiting.clear()
+
+    def _due(self, substance_id, timer):
+        with self._lock:
+            # A submit may have replaced this timer after it fired
+            if self._timers.get(substance_id) is not timer:
+                return
+            del self._timers[substance_id]
+            if substance_id in self._running:
+                self._waiting.add(substance_id)
+                return
+            self._start(substance_id)
+
+    def _start(self, substance_id):
+        """Start a job; called with the lock held"""
+        self._running.add(substance_id)
+        thread = threading.Thread(target=self._run, args=(substance_id,))
+        thread.daemon = True
+        thread.start()
+
+    def _run(self, substance_id):
+        try:
+            self._solve(substance_id)
+        except Exception as e:
+            print(f"Error in queued solve for substance {substance_id}: {e}")
+        finally:
+            with self._lock:
+                self._running.discard(substance_id)
+                if substance_id in self._waiting:
+                    self._waiting.discard(substance_id)
+                    self._start(substance_id)
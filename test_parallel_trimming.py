@@ -0,0 +1,149 @@
+import json
+import sqlite3
+
+import numpy as np
+import pytest
+from parallel_trimming import (apply_production, ensure_trimming_plan_columns, reuse_stored_plan, run_parallel_trimming,
+                               store_trimming_results, stored_order_book, substance_fingerprint)
+from trimming_greedy import trimming_greedy
+
+BOOK = [(100, 6), (104, 4), (150, 9), (160, 5), (200, 3)]
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    """A trimming_system.db in a scratch directory, with the tables the trimming code reads"""
+    monkeypatch.chdir(tmp_path)
+    conn = sqlite3.connect('trimming_system.db')
+    conn.execute("CREATE TABLE substances (id INTEGER PRIMARY KEY, name TEXT UNIQUE, description TEXT)")
+    conn.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, ukuran INTEGER, quantity INTEGER, substance_id INTEGER)")
+    conn.execute("CREATE TABLE trimming_plan (id INTEGER PRIMARY KEY, substance_id INTEGER, "
+                 "ukuran_finaltrim_sisaorder TEXT, weight_final REAL, detail_trim_PM1_PM2 TEXT, cut_1_final INTEGER)")
+    ensure_trimming_plan_columns(conn)
+    yield conn
+    conn.close()
+
+
+def set_orders(conn, substance_id, book):
+    conn.execute("INSERT OR IGNORE INTO substances (id, name) VALUES (?, ?)", (substance_id, f"S{substance_id}"))
+    conn.execute("DELETE FROM orders WHERE substance_id = ?", (substance_id,))
+    conn.executemany("INSERT INTO orders (ukuran, quantity, substance_id) VALUES (?, ?, ?)",
+                     [(ukuran, quantity, substance_id) for ukuran, quantity in book])
+    conn.commit()
+
+
+def store_plan(conn, substance_id, **info):
+    """Store the greedy plan of a substance's current orders under their fingerprint"""
+    ukuran, order = (np.array(column) for column in zip(*conn.execute(
+        "SELECT ukuran, quantity FROM orders WHERE substance_id = ? ORDER BY ukuran", (substance_id,)).fetchall()))
+    result = trimming_greedy(order, ukuran, 312, 312, 312)
+    store_trimming_results(conn, substance_id, result,
+                           dict(info, fingerprint=substance_fingerprint(conn, substance_id)))
+    return result
+
+
+def stored(conn, substance_id):
+    return conn.execute("SELECT ukuran_finaltrim_sisaorder, weight_final, detail_trim_PM1_PM2, truncated "
+                        "FROM trimming_plan WHERE substance_id = ?", (substance_id,)).fetchone()
+
+
+def test_apply_production_takes_cuts_off_the_plan(conn):
+    set_orders(conn, 1, BOOK)
+    result = store_plan(conn, 1)
+    row = result[2][0]
+    widths = [int(width) for width in row[0::2] if width]
+    taken = {width: widths.count(width) for width in widths}
+    set_orders(conn, 1, [(u, q - taken.get(u, 0)) for u, q in BOOK])
+
+    assert apply_production(conn, 1, widths, 1)
+    ukuran, order = stored_order_book(stored(conn, 1)[0])
+    assert list(zip(ukuran.tolist(), order.tolist())) == [(u, q - taken.get(u, 0)) for u, q in BOOK]
+    # Production takes whole cuts out of the plan, so the leftover rolls and the weight stay put
+    assert stored(conn, 1)[1] == pytest.approx(result[1])
+    assert np.asarray(json.loads(stored(conn, 1)[2]))[:, 1].sum() == result[2][:, 1].sum() - 1
+
+
+def test_apply_production_refuses_a_plan_of_other_orders(conn):
+    set_orders(conn, 1, BOOK)
+    result = store_plan(conn, 1)
+    widths = [int(width) for width in result[2][0][0::2] if width]
+    # The orders table was not decremented, so the stored plan less this production is not its book
+    assert not apply_production(conn, 1, widths, 1)
+
+
+def test_reuse_skips_final_plans_and_copies_them_to_identical_books(conn):
+    set_orders(conn, 1, BOOK)
+    set_orders(conn, 2, BOOK)
+    store_plan(conn, 1)
+    fingerprint = substance_fingerprint(conn, 1)
+
+    assert reuse_stored_plan(conn, 1, fingerprint)
+    assert reuse_stored_plan(conn, 2, fingerprint)
+    assert stored(conn, 2)[0] == stored(conn, 1)[0]
+
+
+def test_reuse_resolves_truncated_plans_short_of_the_bound(conn):
+    set_orders(conn, 1, BOOK)
+    # A zero bound, which no plan with leftover rolls meets
+    result = store_plan(conn, 1, truncated=True, lower_bound=0.0)
+    fingerprint = substance_fingerprint(conn, 1)
+    assert result[1] > 0
+    assert not reuse_stored_plan(conn, 1, fingerprint)
+    assert reuse_stored_plan(conn, 1, fingerprint, final_only=False)
+
+    # At its lower bound a truncated plan is final all the same
+    store_plan(conn, 1, truncated=True, lower_bound=result[1])
+    assert reuse_stored_plan(conn, 1, fingerprint)
+
+
+class InlinePool:
+    """Stand-in for SolvePool that 'solves' each batch job by storing its greedy plan with `info`"""
+    processes = 1
+
+    def __init__(self, conn, store=True, **info):
+        self.conn = conn
+        self.store = store
+        self.info = info
+        self.solved = []
+
+    def solve_all(self, jobs):
+        for substance_id, _ in jobs:
+            self.solved.append(substance_id)
+            if self.store:
+                store_plan(self.conn, substance_id, **self.info)
+
+
+@pytest.mark.parametrize('info', [{}, {'truncated': True, 'lower_bound': 0.0}, {'partial': True}])
+def test_followers_take_the_plan_their_leader_stored(conn, info):
+    other = [(120, 4), (180, 4)]
+    set_orders(conn, 1, other)
+    set_orders(conn, 2, other)
+    store_plan(conn, 1)
+    store_plan(conn, 2)
+    # Both substances move to the same new book: one is solved, the other shares its plan
+    set_orders(conn, 1, BOOK)
+    set_orders(conn, 2, BOOK)
+
+    pool = InlinePool(conn, **info)
+    run_parallel_trimming(pool=pool)
+
+    assert len(pool.solved) == 1
+    leader, follower = pool.solved[0], 3 - pool.solved[0]
+    assert stored(conn, follower)[0] == stored(conn, leader)[0]
+    ukuran, order = stored_order_book(stored(conn, follower)[0])
+    assert list(zip(ukuran.tolist(), order.tolist())) == BOOK
+
+
+def test_followers_drop_their_plan_when_the_leader_stores_none(conn):
+    set_orders(conn, 1, [(120, 4), (180, 4)])
+    set_orders(conn, 2, [(120, 4), (180, 4)])
+    store_plan(conn, 1)
+    store_plan(conn, 2)
+    set_orders(conn, 1, BOOK)
+    set_orders(conn, 2, BOOK)
+
+    pool = InlinePool(conn, store=False)
+    run_parallel_trimming(pool=pool)
+
+    follower = 3 - pool.solved[0]
+    assert stored(conn, follower) is None
@@ -0,0 +1,21 @@
+import pytest
+from trimming_bound import combinatorial_bound, lower_bound
+from trimming_exact import trimming_exact
+from trimming_patterns import WEIGHT_CONSTANT, candidate_patterns
+
+pytestmark = pytest.mark.needs_scipy
+
+
+def test_lower_bound_never_exceeds_the_optimum(random_books):
+    tight = 0
+    # Widths from 90 to 220, so both 2-out and 3-out patterns fit a 312 machine
+    for ukuran, order in random_books(150, seed=7, widths=(1, 12), sizes=(90, 220), max_quantity=24):
+        bound = lower_bound(order, ukuran, 312, 312, 312)
+        optimum = trimming_exact(order, ukuran, 312, 312, 312)[1]
+        assert bound <= optimum + 1e-9
+        patterns = candidate_patterns(ukuran, 312, 312, 312)
+        assert combinatorial_bound(order, ukuran, patterns) * WEIGHT_CONSTANT <= optimum + 1e-9
+        if bound == pytest.approx(optimum, abs=1e-9):
+            tight += 1
+    # The bound is only useful as a stop criterion when it is usually tight
+    assert tight > 75
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from trimming_exact import trimming_exact
+from trimming_matching import trimming_matching, two_out_only
+
+pytestmark = pytest.mark.needs_scipy
+
+
+def test_matching_plans_are_feasible_and_optimal_when_flagged(random_books):
+    proven = 0
+    # Widths from 138 to 174, where only 2-out patterns fit a 312 machine
+    for ukuran, order in random_books(150, seed=5, widths=(2, 16), sizes=(138, 174), max_quantity=29):
+        assert two_out_only(ukuran, 312, 312)
+        info = {}
+        result = trimming_matching(order, ukuran, 312, 312, 312, info=info)
+        # No width is cut more often than it is ordered
+        assert (result[0][:, 5] >= 0).all()
+        assert np.array_equal(result[0][:, 4] + result[0][:, 5], order)
+
+        exact = trimming_exact(order, ukuran, 312, 312, 312)
+        assert result[1] >= exact[1] - 1e-9
+        if info['optimal']:
+            assert result[1] == pytest.approx(exact[1], abs=1e-9)
+            proven += 1
+    # The flag has to fire on a good share of books for the check above to mean anything
+    assert proven > 50
@@ -0,0 +1,136 @@
+import math
+import time
+
+import numpy as np
+from trimming_random import check_interruption
+from trimming_bound import meets_bound
+from trimming_greedy import trimming_greedy
+from trimming_local_search import local_search, split_time_budget
+from trimming_patterns import (better_result, candidate_patterns, detail_plan, interrupted_result, plan_result,
+                               WEIGHT_CONSTANT)
+
+# Move kinds of the annealing chain
+MOVE_ADD = 0     # cut one more of a pattern the leftover rolls allow
+MOVE_REMOVE = 1  # give back the rolls of one cut
+MOVE_SWAP = 2    # give back one cut and cut a pattern the freed plus leftover rolls allow
+
+# Seconds the chain cools over when the caller sets no time budget; the schedule needs an end
+DEFAULT_TIME_BUDGET = 10.0
+
+
+def _pattern_matrix(patterns, widths):
+    """(patterns, widths) matrix of how many rolls of each width one cut of a pattern uses"""
+    usage = np.zeros((len(patterns), widths), dtype=int)
+    for row, (_, indices) in enumerate(patterns):
+        for i in indices:
+            usage[row, i] += 1
+    return usage
+
+
+def _cuts_plan(patterns, cuts):
+    """(machine, indices, count) plan of a cuts-per-pattern-row vector"""
+    return [(patterns[row][0], patterns[row][1], int(count)) for row, count in enumerate(cuts) if count > 0]
+
+
+def trimming_annealing(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id=None, seed=None,
+                       warm_start=None, time_budget=DEFAULT_TIME_BUDGET, local_search_budget=1.0, anytime=False,
+                       info=None, lower_bound=None):
+    """
+        Simulated annealing trimming calculation over complete plans
+        Each step adds, removes or swaps one 2-out or 3-out cut and is accepted by the
+        Metropolis rule on the change in leftover weight, with the temperature cooling
+        geometrically over `time_budget` seconds of wall-clock time (local search included),
+        or over DEFAULT_TIME_BUDGET seconds when `time_budget` is None
+        Options work as in trimming_random, with annealing steps counted as iterations
+        Returns (ukuran_finaltrim_sisaorder_final, weight_final, detail_trim_PM1_PM2, cut_1_final)
+    """
+    ukuran = np.asarray(ukuran)
+    orderan = np.asarray(order).astype(int)
+    rng = np.random.default_rng(seed)
+
+    patterns = candidate_patterns(ukuran, lebar_1, lebar_2, lebar_3)
+    start = better_result(trimming_greedy(orderan, ukuran, lebar_1, lebar_2, lebar_3), warm_start)
+    if info is not None:
+        info.update(partial=False, iterations=0, truncated=False)
+    if not patterns:
+        return start
+
+    usage = _pattern_matrix(patterns, len(orderan))
+    pattern_widths = usage @ ukuran
+    row_of = {pattern: row for row, pattern in enumerate(patterns)}
+
+    # Chain state: cuts per pattern row and the rolls left over
+    cuts = np.zeros(len(patterns), dtype=int)
+    for machine, indices, count in detail_plan(start[2], ukuran, lebar_1):
+        cuts[row_of[(machine, indices)]] += count
+    remaining = orderan - cuts @ usage
+    # Leftover weight is tracked as the leftover width, in whole width units
+    leftover = int(np.sum(ukuran * remaining))
+    best_leftover = leftover
+    best_cuts = cuts.copy()
+
+    # Temperatures in width units: early on a whole cut can be given back now and then
+    temperature_start = 0.5 * pattern_widths.mean()
+    temperature_end = 5.0
+    if time_budget is None:
+        time_budget = DEFAULT_TIME_BUDGET
+    time_budget, local_search_budget = split_time_budget(time_budget, local_search_budget)
+    started = time.monotonic()
+    iteration = 0
+    while True:
+        elapsed = time.monotonic() - started
+        if best_leftover == 0 or meets_bound(best_leftover * WEIGHT_CONSTANT, lower_bound):
+            break
+        if elapsed >= time_budget:
+            if info is not None:
+                info['truncated'] = True
+            break
+        iteration += 1
+        if iteration % 1000 == 0 and check_interruption(substance_id):
+            print(f"Trimming calculation interrupted for substance {substance_id}")
+            if info is not None:
+                info['iterations'] = iteration
+            best = better_result(start, plan_result(orderan, ukuran, _cuts_plan(patterns, best_cuts)))
+            return interrupted_result(best, anytime, info)
+        temperature = temperature_start * (temperature_end / temperature_start) ** (elapsed / time_budget)
+
+        move = rng.integers(3)
+        removed = None
+        freed = remaining
+        if move != MOVE_ADD:
+            used = np.flatnonzero(cuts)
+            if len(used) == 0:
+                continue
+            removed = used[rng.integers(len(used))]
+            freed = remaining + usage[removed]
+        added = None
+        if move != MOVE_REMOVE:
+            allowed = np.flatnonzero((usage <= freed).all(axis=1))
+            if removed is not None:
+                allowed = allowed[allowed != removed]
+            if len(allowed) == 0:
+                continue
+            added = allowed[rng.integers(len(allowed))]
+
+        gain = (pattern_widths[added] if added is not None else 0) - \
+               (pattern_widths[removed] if removed is not None else 0)
+        if gain < 0 and rng.random() >= math.exp(gain / temperature):
+            continue
+
+        if removed is not None:
+            cuts[removed] -= 1
+        if added is not None:
+            cuts[added] += 1
+            freed = freed - usage[added]
+        remaining = freed
+        leftover -= gain
+        if leftover < best_leftover:
+            best_leftover = leftover
+            best_cuts = cuts.copy()
+
+    print(f"Annealing finished after {iteration} steps: Best weight = {best_leftover * WEIGHT_CONSTANT}")
+    if info is not None:
+        info['iterations'] = iteration
+    result = better_result(start, plan_result(orderan, ukuran, _cuts_plan(patterns, best_cuts)))
+    return local_search(result, orderan, ukuran, lebar_1, lebar_2, lebar_3,
+                        time_budget=local_search_budget, substance_id=substance_id)
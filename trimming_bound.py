@@ -0,0 +1,79 @@
+import math
+
+import numpy as np
+from trimming_patterns import WEIGHT_CONSTANT, candidate_patterns
+
+try:
+    from scipy.optimize import linprog
+except ImportError:  # scipy is optional; without it only the combinatorial bound is used
+    linprog = None
+
+# Weights within this many tonnes of the lower bound count as meeting it
+BOUND_TOLERANCE = 1e-9
+
+
+def _self_only_leftover(count, sizes):
+    """Rolls of `count` left over when they can only be cut in groups of the given sizes (2 and/or 3)"""
+    if sizes == {2}:
+        return count % 2
+    if sizes == {3}:
+        return count % 3
+    return 1 if count == 1 else 0
+
+
+def combinatorial_bound(order, ukuran, patterns):
+    """
+        Leftover width no plan can avoid, counted per width: a width in no pattern is left over
+        entirely, and a width only cut with itself, as (i, i) or (i, i, i), leaves the rolls its
+        pattern sizes cannot make up
+    """
+    own_patterns = {}
+    for _, indices in patterns:
+        for i in set(indices):
+            own_patterns.setdefault(i, []).append(indices)
+
+    leftover = 0
+    for i, (width, count) in enumerate(zip(np.asarray(ukuran).tolist(), np.asarray(order).tolist())):
+        own = own_patterns.get(i, [])
+        if not own:
+            leftover += width * count
+        elif all(set(indices) == {i} for indices in own):
+            leftover += width * _self_only_leftover(count, {len(indices) for indices in own})
+    return leftover
+
+
+def lp_bound(order, ukuran, patterns):
+    """
+        Leftover width of the LP relaxation of the pattern-count program (fractional cuts allowed),
+        rounded up to a whole width unit; None when scipy is missing or the LP fails
+    """
+    if linprog is None or not patterns:
+        return None
+    usage = np.zeros((len(order), len(patterns)))
+    for p, (_, indices) in enumerate(patterns):
+        for i in indices:
+            usage[i, p] += 1
+    res = linprog(-(ukuran @ usage), A_ub=usage, b_ub=order, bounds=(0, None), method='highs')
+    if res.status != 0:
+        return None
+    return max(0, math.ceil(int(ukuran @ order) + res.fun - 1e-6))
+
+
+def lower_bound(order, ukuran, lebar_1, lebar_2, lebar_3):
+    """
+        Lower bound on the leftover weight (tonnes) any plan of an order book can reach: the
+        better of the LP relaxation, when scipy is installed, and the combinatorial bound
+    """
+    ukuran = np.asarray(ukuran).astype(int)
+    order = np.asarray(order).astype(int)
+    patterns = candidate_patterns(ukuran, lebar_1, lebar_2, lebar_3)
+    leftover = combinatorial_bound(order, ukuran, patterns)
+    relaxed = lp_bound(order, ukuran, patterns)
+    if relaxed is not None:
+        leftover = max(leftover, relaxed)
+    return leftover * WEIGHT_CONSTANT
+
+
+def meets_bound(weight, bound):
+    """True when a plan's weight reaches the lower bound, i.e. the plan is optimal"""
+    return bound is not None and weight is not None and weight <= bound + BOUND_TOLERANCE
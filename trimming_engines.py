@@ -0,0 +1,86 @@
+import numpy as np
+from trimming_random import trimming_random
+from trimming_vectorized import trimming_vectorized
+from trimming_greedy import trimming_greedy
+from trimming_exact import trimming_exact, milp
+from trimming_annealing import trimming_annealing
+from trimming_matching import trimming_matching, two_out_only
+
+# Solver engines selectable per call; all share the trimming_random signature and return tuple:
+# engine(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id=None, seed=None, **options) returns
+# (ukuran_finaltrim_sisaorder_final, weight_final, detail_trim_PM1_PM2, cut_1_final).
+# The search engines take these options, as listed in the sets below:
+#   warm_start           an earlier result tuple; the search starts from it when it beats the greedy plan
+#   local_search_budget  seconds of local search polishing the best plan found
+#   anytime              an interrupted search returns its best plan so far instead of None
+#   info                 a dict the engine fills with 'partial' (interrupted), 'iterations' (completed)
+#                        and 'truncated' (the time budget, not the search, ended the solve)
+#   time_budget          wall-clock seconds of the whole call, local search included
+#   lower_bound          tonnes, from trimming_bound; the search stops once its best plan reaches it
+ENGINES = {
+    'random': trimming_random,
+    'vectorized': trimming_vectorized,
+    'greedy': trimming_greedy,
+    'exact': trimming_exact,
+    'matching': trimming_matching,
+    'annealing': trimming_annealing,
+}
+
+# Search engines that start from the better of the exact 2-out plan and the substance's stored plan
+# carried over to its new orders, instead of an empty one
+WARM_STARTED_ENGINES = {'random', 'vectorized', 'annealing'}
+
+# Engines that can hand back their best plan so far when interrupted (anytime mode)
+ANYTIME_ENGINES = {'random', 'vectorized', 'annealing'}
+
+# Search engines that stop as soon as their best plan reaches the lower bound (see trimming_bound)
+BOUNDED_ENGINES = {'random', 'vectorized', 'annealing'}
+
+# Randomised search engines: independently seeded runs of one order book explore different plans,
+# so a dominant substance can run one per pool worker and keep the best (see run_parallel_trimming)
+SPLITTABLE_ENGINES = {'random', 'vectorized', 'annealing'}
+
+# Keyword each engine takes its wall-clock budget in (seconds); engines not listed are fast and take none
+TIME_BUDGET_OPTIONS = {
+    'random': 'time_budget',
+    'vectorized': 'time_budget',
+    'annealing': 'time_budget',
+    'exact': 'time_limit',
+}
+
+# Engine per substance name, e.g. {'WP65': 'matching'}; substances not listed use DEFAULT_ENGINE
+SUBSTANCE_ENGINES = {}
+DEFAULT_ENGINE = 'auto'
+
+# Auto-selection limits: order books up to this size go to the exact MILP, as long as
+# its last measured run for the substance stayed under EXACT_MAX_SECONDS
+EXACT_MAX_WIDTHS = 40
+EXACT_MAX_QUANTITY = 5000
+EXACT_MAX_SECONDS = 60
+
+
+def select_engine(order, ukuran, lebar_1, lebar_2, lebar_3, history=None):
+    """
+        Pick an engine for one order book by its width count, total quantity and the
+        measured runtime of the last solve (`history` is (engine, solve_seconds) or None).
+        A slow exact solve sends the next run to a heuristic; the run after that measures exact again.
+        Returns (engine, reason)
+    """
+    widths = len(ukuran)
+    quantity = int(np.sum(order))
+    size = f"{widths} widths, {quantity} rolls"
+
+    slow_exact = history is not None and history[0] == 'exact' and history[1] is not None \
+        and history[1] > EXACT_MAX_SECONDS
+    if milp is None:
+        reason = "scipy is not installed"
+    elif widths > EXACT_MAX_WIDTHS or quantity > EXACT_MAX_QUANTITY:
+        reason = f"{size} is over the exact limit of {EXACT_MAX_WIDTHS} widths, {EXACT_MAX_QUANTITY} rolls"
+    elif slow_exact:
+        reason = f"the last exact solve took {history[1]:.1f}s (limit {EXACT_MAX_SECONDS}s)"
+    else:
+        return 'exact', f"{size}: small enough for the exact MILP"
+
+    if two_out_only(ukuran, lebar_1, lebar_3):
+        return 'matching', f"{reason}; no 3-out pattern fits, so 2-out pairing by min-cost flow"
+    return 'annealing', f"{reason}; time-boxed annealing"
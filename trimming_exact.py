@@ -0,0 +1,61 @@
+import numpy as np
+from trimming_random import check_interruption
+from trimming_patterns import candidate_patterns, plan_result
+
+try:
+    from scipy.optimize import Bounds, LinearConstraint, milp
+except ImportError:  # scipy is optional; only the exact engine needs it
+    milp = None
+
+
+def trimming_exact(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id=None, seed=None, time_limit=None,
+                   info=None):
+    """
+        Exact trimming calculation: enumerates every 2-out and 3-out pattern inside the
+        trim window and solves the pattern-count integer program with scipy's MILP solver.
+        Minimises leftover width (hence weight), then maximises the number of PM1 cuts.
+        Marks `info['truncated']` when `time_limit` stopped the solver before it proved optimality.
+        Returns (ukuran_finaltrim_sisaorder_final, weight_final, detail_trim_PM1_PM2, cut_1_final)
+    """
+    if milp is None:
+        raise RuntimeError("The exact trimming engine requires scipy")
+
+    ukuran = np.asarray(ukuran)
+    order = np.asarray(order)
+    patterns = candidate_patterns(ukuran, lebar_1, lebar_2, lebar_3)
+    if not patterns:
+        return plan_result(order, ukuran, [])
+
+    if check_interruption(substance_id):
+        print(f"Trimming calculation interrupted for substance {substance_id}")
+        return None, None, None, None
+
+    # usage[w, p]: rolls of width w consumed by one cut of pattern p
+    usage = np.zeros((len(order), len(patterns)))
+    for p, (machine, indices) in enumerate(patterns):
+        for index in indices:
+            usage[index, p] += 1
+
+    # Widths are whole numbers, so a PM1 bonus below 1 / total cuts never outweighs a unit of width
+    pm1_bonus = 1 / (order.sum() + 1)
+    cost = -(ukuran @ usage) - pm1_bonus * np.array([machine == 1 for machine, _ in patterns])
+
+    # scipy stops at a 0.01% relative gap by default; ask for the true optimum
+    options = {'mip_rel_gap': 0}
+    if time_limit is not None:
+        options['time_limit'] = time_limit
+    res = milp(cost,
+               constraints=LinearConstraint(usage, 0, order),
+               integrality=np.ones(len(patterns)),
+               bounds=Bounds(0, np.inf),
+               options=options)
+    if res.x is None:
+        print(f"Exact trimming found no solution for substance {substance_id}: {res.message}")
+        return None, None, None, None
+    if info is not None:
+        # scipy's milp reports status 1 when a limit stopped it with a feasible, unproven plan
+        info['truncated'] = res.status == 1
+
+    counts = np.round(res.x).astype(int)
+    plan = [(machine, indices, count) for (machine, indices), count in zip(patterns, counts) if count > 0]
+    return plan_result(order, ukuran, plan)
@@ -0,0 +1,85 @@
+import numpy as np
+from trimming_patterns import candidate_patterns, plan_result
+
+
+def patterns_by_width(ukuran, patterns):
+    """Map each width index to the (machine, indices) patterns containing it, best fitting (least trim loss) first"""
+    by_width = {}
+    for machine, indices in sorted(patterns, key=lambda pattern: -sum(ukuran[i] for i in pattern[1])):
+        for index in set(indices):
+            by_width.setdefault(index, []).append((machine, indices))
+    return by_width
+
+
+def fill_plan(remaining, ukuran, by_width, cuts):
+    """
+        First-fit-decreasing fill of the `remaining` rolls, in place.
+        Takes widths from widest to narrowest and, while rolls of a width remain, cuts the
+        widest pattern containing it that the remaining rolls still allow, as often as possible.
+        Cut counts are added to the `cuts` dict keyed by (machine, indices).
+    """
+    for width in np.argsort(-np.asarray(ukuran), kind='stable'):
+        for machine, indices in by_width.get(width, []):
+            if remaining[width] == 0:
+                break
+            count = min(remaining[i] // indices.count(i) for i in indices)
+            if count == 0:
+                continue
+            for i in indices:
+                remaining[i] -= count
+            cuts[(machine, indices)] = cuts.get((machine, indices), 0) + count
+    return cuts
+
+
+def greedy_plan(order, ukuran, patterns):
+    """
+        First-fit-decreasing construction over a list of (machine, indices) patterns.
+        Returns the plan as a list of (machine, indices, count).
+    """
+    cuts = fill_plan(np.array(order, dtype=int), ukuran, patterns_by_width(ukuran, patterns), {})
+    return [(machine, indices, count) for (machine, indices), count in cuts.items()]
+
+
+def trimming_greedy(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id=None, seed=None):
+    """
+        Deterministic greedy trimming calculation (first-fit decreasing over 2-out and 3-out patterns)
+        Returns (ukuran_finaltrim_sisaorder_final, weight_final, detail_trim_PM1_PM2, cut_1_final)
+    """
+    ukuran = np.asarray(ukuran)
+    patterns = candidate_patterns(ukuran, lebar_1, lebar_2, lebar_3)
+    return plan_result(order, ukuran, greedy_plan(order, ukuran, patterns))
+
+
+def carry_over_plan(detail, ukuran, order, lebar_1, lebar_2, lebar_3):
+    """
+        Rebuild an earlier plan (its detail_trim_PM1_PM2 rows) for a changed order book.
+        Patterns whose widths are all still ordered are kept, widest first, with their cuts capped
+        at what the new orders allow; the rolls left over, i.e. the change in the order book, are
+        then placed by the greedy fill. Used as the warm start of a re-solve.
+        Returns (ukuran_finaltrim_sisaorder_final, weight_final, detail_trim_PM1_PM2, cut_1_final)
+    """
+    ukuran = np.asarray(ukuran)
+    patterns = candidate_patterns(ukuran, lebar_1, lebar_2, lebar_3)
+    machine_of = {indices: machine for machine, indices in patterns}
+    index_of = {width: i for i, width in enumerate(ukuran.tolist())}
+
+    kept = []
+    for row in np.asarray(detail, dtype=float).reshape(-1, 6).tolist():
+        widths = [row[k] for k in (0, 2, 4) if row[k]]
+        if all(width in index_of for width in widths):
+            indices = tuple(sorted(index_of[width] for width in widths))
+            if indices in machine_of:
+                kept.append((indices, int(round(row[1]))))
+
+    remaining = np.array(order, dtype=int)
+    cuts = {}
+    for indices, count in sorted(kept, key=lambda pattern: -sum(ukuran[i] for i in pattern[0])):
+        count = min(count, min(remaining[i] // indices.count(i) for i in indices))
+        if count == 0:
+            continue
+        for i in indices:
+            remaining[i] -= count
+        pattern = (machine_of[indices], indices)
+        cuts[pattern] = cuts.get(pattern, 0) + count
+    fill_plan(remaining, ukuran, patterns_by_width(ukuran, patterns), cuts)
+    return plan_result(order, ukuran, [(machine, indices, count) for (machine, indices), count in cuts.items()])
@@ -0,0 +1,120 @@
+import time
+from itertools import combinations_with_replacement
+
+import numpy as np
+from trimming_greedy import fill_plan, patterns_by_width
+from trimming_patterns import candidate_patterns, detail_plan, plan_result
+
+
+def _pattern_width(ukuran, indices):
+    return sum(ukuran[i] for i in indices)
+
+
+def _best_refill(freed, leftover, ejected, ukuran, patterns, by_width):
+    """
+        Refill the rolls freed by `ejected` plus the leftover ones.
+        Tries a plain greedy fill, and a fill led by each pattern joining a leftover roll to
+        a freed one (cut as often as possible first), and keeps the one that cuts the most width.
+        Returns (cut width, cuts dict, remaining rolls).
+    """
+    ejected_widths = {i for _, indices in ejected for i in indices}
+    leads = [None] + [pattern for pattern in patterns
+                      if ejected_widths.intersection(pattern[1])
+                      and any(leftover[i] > 0 for i in pattern[1])]
+
+    best = None
+    for lead in leads:
+        remaining = freed.copy()
+        cuts = {}
+        if lead is not None:
+            indices = lead[1]
+            count = min(remaining[i] // indices.count(i) for i in indices)
+            if count == 0:
+                continue
+            for i in indices:
+                remaining[i] -= count
+            cuts[lead] = count
+        fill_plan(remaining, ukuran, by_width, cuts)
+        width = sum(count * _pattern_width(ukuran, indices) for (_, indices), count in cuts.items())
+        if best is None or width > best[0]:
+            best = (width, cuts, remaining)
+    return best
+
+
+def improve_plan(order, ukuran, plan, patterns, time_budget=1.0):
+    """
+        Local search on a (machine, indices, count) plan.
+        Each move ejects one cut, or two cuts of the same or different patterns, and refills
+        the freed rolls plus the leftover ones; a move is kept only when it cuts more width,
+        e.g. a 3-out cut and a leftover roll rebuilt as two 2-out cuts.
+        Stops when no move improves or `time_budget` seconds have passed.
+    """
+    deadline = time.monotonic() + time_budget
+    by_width = patterns_by_width(ukuran, patterns)
+    cuts = {}
+    remaining = np.array(order, dtype=int)
+    for machine, indices, count in plan:
+        cuts[(machine, indices)] = cuts.get((machine, indices), 0) + count
+        for i in indices:
+            remaining[i] -= count
+    fill_plan(remaining, ukuran, by_width, cuts)
+
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        used = [pattern for pattern, count in cuts.items() if count > 0]
+        for ejected in combinations_with_replacement(used, 2):
+            if time.monotonic() >= deadline:
+                break
+            # (p, p) stands for ejecting p alone when p is only cut once
+            if ejected[0] == ejected[1] and cuts[ejected[0]] < 2:
+                ejected = ejected[:1]
+            freed = remaining.copy()
+            for _, indices in ejected:
+                for i in indices:
+                    freed[i] += 1
+            width, refill, left = _best_refill(freed, remaining, ejected, ukuran, patterns, by_width)
+            if width <= sum(_pattern_width(ukuran, indices) for _, indices in ejected):
+                continue
+
+            for pattern in ejected:
+                cuts[pattern] -= 1
+            for pattern, count in refill.items():
+                cuts[pattern] = cuts.get(pattern, 0) + count
+            remaining = left
+            improved = True
+            break
+
+    return [(machine, indices, count) for (machine, indices), count in cuts.items() if count > 0]
+
+
+def split_time_budget(time_budget, local_search_budget):
+    """
+        Split a total time budget between a search and its local-search pass, which gets at most
+        a tenth of it. Returns (search seconds, local-search seconds); search seconds are None
+        when there is no budget.
+    """
+    if time_budget is None:
+        return None, local_search_budget
+    local_search_budget = min(local_search_budget, 0.1 * time_budget)
+    return time_budget - local_search_budget, local_search_budget
+
+
+def local_search(result, order, ukuran, lebar_1, lebar_2, lebar_3, time_budget=1.0, substance_id=None):
+    """
+        Run the local-search improvement pass on a result tuple and report the weight it saved.
+        Returns the improved result tuple, or `result` itself when nothing improved.
+    """
+    if result is None or result[0] is None or time_budget <= 0:
+        return result
+
+    ukuran = np.asarray(ukuran)
+    patterns = candidate_patterns(ukuran, lebar_1, lebar_2, lebar_3)
+    plan = detail_plan(result[2], ukuran, lebar_1)
+    improved = plan_result(order, ukuran, improve_plan(order, ukuran, plan, patterns, time_budget))
+
+    saved = result[1] - improved[1]
+    if saved <= 1e-9:
+        return result
+    print(f"Local search saved {saved:.4f} tonnes for substance {substance_id}")
+    return improved
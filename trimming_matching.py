@@ -0,0 +1,272 @@
+from collections import deque
+
+import numpy as np
+from trimming_random import check_interruption
+from trimming_patterns import candidate_patterns, feasible_triples, plan_result
+
+
+class _FlowNetwork:
+    """Residual graph for successive-shortest-path min-cost flow"""
+
+    def __init__(self, nodes):
+        self.edges = [[] for _ in range(nodes)]
+
+    def add_edge(self, source, target, capacity, cost):
+        """Add an arc and its residual twin; returns (source, position) to read its flow later"""
+        self.edges[source].append([target, capacity, cost, len(self.edges[target])])
+        self.edges[target].append([source, 0, -cost, len(self.edges[source]) - 1])
+        return source, len(self.edges[source]) - 1
+
+    def flow(self, source, position, capacity):
+        return capacity - self.edges[source][position][1]
+
+    def _shortest_path(self, source):
+        """Bellman-Ford (queue based), since pattern arcs carry negative costs"""
+        nodes = len(self.edges)
+        distance = [float('inf')] * nodes
+        parent = [None] * nodes
+        in_queue = [False] * nodes
+        distance[source] = 0
+        queue = deque([source])
+        in_queue[source] = True
+        while queue:
+            node = queue.popleft()
+            in_queue[node] = False
+            for position, (target, capacity, cost, _) in enumerate(self.edges[node]):
+                if capacity > 0 and distance[node] + cost < distance[target]:
+                    distance[target] = distance[node] + cost
+                    parent[target] = (node, position)
+                    if not in_queue[target]:
+                        queue.append(target)
+                        in_queue[target] = True
+        return distance, parent
+
+    def min_cost_flow(self, source, sink):
+        """Augment along cheapest paths while they still lower the total cost"""
+        total_cost = 0
+        while True:
+            distance, parent = self._shortest_path(source)
+            if distance[sink] >= 0:
+                return total_cost
+
+            push = float('inf')
+            node = sink
+            while node != source:
+                previous, position = parent[node]
+                push = min(push, self.edges[previous][position][1])
+                node = previous
+
+            node = sink
+            while node != source:
+                previous, position = parent[node]
+                edge = self.edges[previous][position]
+                edge[1] -= push
+                self.edges[node][edge[3]][1] += push
+                node = previous
+            total_cost += push * distance[sink]
+
+
+def max_width_pairing(order, ukuran, pairs):
+    """
+        Pair rolls to maximise the total width cut with 2-out patterns (a b-matching).
+        Solves the bipartite double cover of the pairing graph with min-cost flow, which
+        gives the half-integral LP optimum. Whole pairs are kept, half pairs are rounded
+        along alternating trails, and augmenting/exchange paths then repair what odd
+        cycles lose.
+        Returns ({(i, j): cuts}, upper_bound), where upper_bound is the largest width any
+        2-out plan can cut; the plan is optimal when its cut width reaches it.
+    """
+    widths = len(order)
+    source, sink = 0, 2 * widths + 1
+    network = _FlowNetwork(2 * widths + 2)
+    for w in range(widths):
+        network.add_edge(source, 1 + w, int(order[w]), 0)
+        network.add_edge(1 + widths + w, sink, int(order[w]), 0)
+
+    # Left copy of i feeds right copy of j: a (i, j) cut is carried as flow i -> j and j -> i,
+    # a (i, i) cut as two units of i -> i, so every cut width is counted twice
+    arcs = []
+    for i, j in pairs:
+        capacity = int(min(order[i], order[j]))
+        weight = int(ukuran[i] + ukuran[j])
+        arcs.append(((i, j), network.add_edge(1 + i, 1 + widths + j, capacity, -weight), capacity))
+        if i != j:
+            arcs.append(((j, i), network.add_edge(1 + j, 1 + widths + i, capacity, -weight), capacity))
+
+    upper_bound = -network.min_cost_flow(source, sink) / 2
+
+    doubled = {}
+    for (i, j), (node, position), capacity in arcs:
+        key = (min(i, j), max(i, j))
+        doubled[key] = doubled.get(key, 0) + network.flow(node, position, capacity)
+
+    # Keep whole pairs, round the half pairs along alternating trails, then fill greedily
+    cuts = {}
+    remaining = np.array(order, dtype=int)
+    for (i, j), units in doubled.items():
+        count = units // 2
+        if count > 0:
+            cuts[(i, j)] = count
+            remaining[i] -= count
+            remaining[j] -= count
+    halves = [pair for pair, units in doubled.items() if units % 2 == 1]
+    _round_half_pairs(cuts, remaining, ukuran, halves)
+    _fill_greedy(cuts, remaining, ukuran, pairs)
+
+    # Improve along alternating paths until none cuts more width
+    while _alternating_path(cuts, remaining, ukuran, pairs):
+        _fill_greedy(cuts, remaining, ukuran, pairs)
+
+    return {pair: count for pair, count in cuts.items() if count > 0}, upper_bound
+
+
+def _round_half_pairs(cuts, remaining, ukuran, halves):
+    """
+        Round the half pairs of the LP solution to whole cuts.
+        The half pairs are split into trails; rounding alternately up and down along a
+        trail keeps every inner width within its rolls, so only odd cycles lose width.
+    """
+    adjacent = {}
+    for pair in halves:
+        i, j = pair
+        if i != j:
+            adjacent.setdefault(i, set()).add(pair)
+            adjacent.setdefault(j, set()).add(pair)
+
+    while any(adjacent.values()):
+        # Start from an odd-degree width when there is one, so the trail is a full path
+        start = next((v for v, edges in adjacent.items() if len(edges) % 2 == 1), None)
+        if start is None:
+            start = next(v for v, edges in adjacent.items() if edges)
+        trail = []
+        node = start
+        while adjacent.get(node):
+            pair = adjacent[node].pop()
+            other = pair[0] if pair[1] == node else pair[1]
+            adjacent[other].discard(pair)
+            trail.append(pair)
+            node = other
+
+        best = None
+        for phase in (0, 1):
+            spare = remaining.copy()
+            chosen = []
+            for position, (i, j) in enumerate(trail):
+                if position % 2 == phase and spare[i] >= 1 and spare[j] >= 1:
+                    chosen.append((i, j))
+                    spare[i] -= 1
+                    spare[j] -= 1
+            gain = sum(ukuran[i] + ukuran[j] for i, j in chosen)
+            if best is None or gain > best[0]:
+                best = (gain, chosen)
+        for i, j in best[1]:
+            cuts[(i, j)] = cuts.get((i, j), 0) + 1
+            remaining[i] -= 1
+            remaining[j] -= 1
+
+    for i, j in halves:
+        if i == j and remaining[i] >= 2:
+            cuts[(i, i)] = cuts.get((i, i), 0) + 1
+            remaining[i] -= 2
+
+
+def _fill_greedy(cuts, remaining, ukuran, pairs):
+    """Cut the widest fitting pairs from the spare rolls"""
+    for i, j in sorted(pairs, key=lambda pair: -(ukuran[pair[0]] + ukuran[pair[1]])):
+        count = remaining[i] // 2 if i == j else min(remaining[i], remaining[j])
+        if count > 0:
+            cuts[(i, j)] = cuts.get((i, j), 0) + count
+            remaining[i] -= count
+            remaining[j] -= count
+
+
+def _alternating_path(cuts, remaining, ukuran, pairs):
+    """
+        Search from every spare roll for an alternating path of new and existing cuts that
+        cuts more width, and apply the first one found; True on success.
+        The path either ends on another spare roll (both rolls get cut) or frees a narrower
+        roll than the one it started from.
+    """
+    partners = {}
+    for i, j in pairs:
+        partners.setdefault(i, []).append(j)
+        if i != j:
+            partners.setdefault(j, []).append(i)
+
+    for start in np.flatnonzero(remaining > 0):
+        # parent[v] = (previous width, new cut, released cut) for the width v freed by the path
+        parent = {start: None}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            for partner in partners.get(node, []):
+                new_cut = (min(node, partner), max(node, partner))
+                if remaining[partner] >= 1 + (partner == start):
+                    if _apply_path(cuts, remaining, parent, node, new_cut, None, start, partner):
+                        return True
+                for released, count in cuts.items():
+                    if count <= 0 or partner not in released or released == new_cut:
+                        continue
+                    freed = released[0] if released[1] == partner else released[1]
+                    if freed in parent:
+                        continue
+                    if ukuran[freed] < ukuran[start] and \
+                            _apply_path(cuts, remaining, parent, node, new_cut, released, start, freed):
+                        return True
+                    parent[freed] = (node, new_cut, released)
+                    queue.append(freed)
+    return False
+
+
+def _apply_path(cuts, remaining, parent, node, new_cut, released, start, end):
+    """Apply an alternating path if it keeps every cut and roll count valid; True on success"""
+    steps = [(new_cut, released)]
+    while parent[node] is not None:
+        node, step_cut, step_released = parent[node]
+        steps.append((step_cut, step_released))
+
+    trial_cuts = dict(cuts)
+    trial_remaining = remaining.copy()
+    for added, removed in steps:
+        trial_cuts[added] = trial_cuts.get(added, 0) + 1
+        if removed is not None:
+            trial_cuts[removed] -= 1
+    trial_remaining[start] -= 1
+    trial_remaining[end] += 1 if released is not None else -1
+    if min(trial_cuts.values()) < 0 or trial_remaining.min() < 0:
+        return False
+
+    cuts.clear()
+    cuts.update(trial_cuts)
+    remaining[:] = trial_remaining
+    return True
+
+
+def two_out_only(ukuran, lebar_1, lebar_3):
+    """True when no 3-out pattern fits either machine, so 2-out pairing is the whole problem"""
+    return len(feasible_triples(ukuran, lebar_1)[0]) == 0 and len(feasible_triples(ukuran, lebar_3)[0]) == 0
+
+
+def trimming_matching(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id=None, seed=None, info=None):
+    """
+        2-out trimming calculation by min-cost-flow b-matching.
+        Fills `info['optimal']` when given an info dict: True when the plan provably cuts the
+        most width any 2-out plan can.
+        Returns (ukuran_finaltrim_sisaorder_final, weight_final, detail_trim_PM1_PM2, cut_1_final)
+    """
+    if check_interruption(substance_id):
+        print(f"Trimming calculation interrupted for substance {substance_id}")
+        return None, None, None, None
+
+    ukuran = np.asarray(ukuran)
+    order = np.asarray(order)
+    machines = {indices: machine for machine, indices in candidate_patterns(ukuran, lebar_1, lebar_2, lebar_3)
+                if len(indices) == 2}
+    cuts, upper_bound = max_width_pairing(order, ukuran, list(machines))
+
+    plan = [(machines[pair], pair, count) for pair, count in cuts.items()]
+    result = plan_result(order, ukuran, plan)
+    if info is not None:
+        cut_width = sum((ukuran[i] + ukuran[j]) * count for (i, j), count in cuts.items())
+        info['optimal'] = cut_width >= upper_bound
+    return result
@@ -0,0 +1,290 @@
+import numpy as np
+
+# Maximum trim loss accepted for a cutting pattern: a pattern is feasible on a
+# machine of width `lebar` when its summed width lies in [lebar - 12, lebar].
+TRIM_WINDOW = 12
+
+# Tonnes per width unit of an unpaired roll, used to weigh the leftover order
+WEIGHT_CONSTANT = 3 / 385
+
+
+def feasible_pairs(ukuran, lebar):
+    """
+        Index every 2-out pattern that fits the trim window of a machine width.
+        Returns an (n, 2) int array of ordered (i, j) index pairs, including i == j,
+        so sampling uniformly from it matches drawing two random indices and
+        keeping only the feasible draws.
+    """
+    ukuran = np.asarray(ukuran)
+    total = ukuran[:, None] + ukuran[None, :]
+    return np.argwhere((lebar - TRIM_WINDOW <= total) & (total <= lebar))
+
+
+# Multiplicity classes of a sorted 3-out pattern (i <= j <= k)
+TRIPLE_DISTINCT = 0   # i < j < k
+TRIPLE_PAIR_LOW = 1   # i == j < k
+TRIPLE_PAIR_HIGH = 2  # i < j == k
+TRIPLE_SAME = 3       # i == j == k
+
+# Per-slot divisors for each class: a triple can be cut
+# min(order[i] // d_i, order[j] // d_j, order[k] // d_k) times, and each cut
+# subtracts one roll per slot (so a repeated width loses 2 or 3 rolls per cut)
+TRIPLE_DIVISORS = np.array([
+    [1, 1, 1],
+    [2, 2, 1],
+    [1, 2, 2],
+    [3, 3, 3],
+])
+
+
+def feasible_triples(ukuran, lebar):
+    """
+        Enumerate every 3-out pattern that fits the trim window of a machine width.
+        Walks the sorted widths with a bisect search for the third width, so the cost
+        is proportional to the number of valid triples rather than len(ukuran) ** 3.
+        Returns (triples, classes): an (n, 3) int array of indices into `ukuran`
+        and the multiplicity class of each triple.
+    """
+    ukuran = np.asarray(ukuran)
+    sort_index = np.argsort(ukuran, kind='stable')
+    sorted_ukuran = ukuran[sort_index]
+    n = len(sorted_ukuran)
+
+    triples = []
+    classes = []
+    for i in range(n):
+        if 3 * sorted_ukuran[i] > lebar:
+            break
+        for j in range(i, n):
+            partial = sorted_ukuran[i] + sorted_ukuran[j]
+            if partial + sorted_ukuran[j] > lebar:
+                break
+            k_start = max(j, np.searchsorted(sorted_ukuran, lebar - TRIM_WINDOW - partial, side='left'))
+            k_end = np.searchsorted(sorted_ukuran, lebar - partial, side='right')
+            for k in range(k_start, k_end):
+                triples.append((sort_index[i], sort_index[j], sort_index[k]))
+                if i == j == k:
+                    classes.append(TRIPLE_SAME)
+                elif i == j:
+                    classes.append(TRIPLE_PAIR_LOW)
+                elif j == k:
+                    classes.append(TRIPLE_PAIR_HIGH)
+                else:
+                    classes.append(TRIPLE_DISTINCT)
+
+    return np.array(triples, dtype=int).reshape(-1, 3), np.array(classes, dtype=int)
+
+
+class PatternLog:
+    """
+        Growable (n, 6) buffer of trim pattern rows.
+        Rows are written into preallocated storage that doubles when full, so
+        appending is amortised O(1) instead of copying the whole plan per row.
+    """
+
+    def __init__(self, capacity=64):
+        self._rows = np.zeros((capacity, 6))
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def clear(self):
+        self._size = 0
+
+    def append(self, width_1, count_1, width_2, count_2, width_3=0, count_3=0):
+        if self._size == len(self._rows):
+            grown = np.zeros((2 * len(self._rows), 6))
+            grown[:self._size] = self._rows
+            self._rows = grown
+        self._rows[self._size] = (width_1, count_1, width_2, count_2, width_3, count_3)
+        self._size += 1
+
+    def view(self):
+        """Rows logged so far, without copying (only valid until the next append or clear)"""
+        return self._rows[:self._size]
+
+    def to_array(self):
+        """Finalize the logged rows into an independent (n, 6) array"""
+        return self._rows[:self._size].copy()
+
+
+def pair_divisors(pairs):
+    """Per-slot divisors of 2-out patterns: a pattern of one width twice takes 2 of its rolls per cut"""
+    return np.where(pairs[:, :1] == pairs[:, 1:], 2, 1).repeat(2, axis=1)
+
+
+class ActivePatterns:
+    """
+        The patterns of one sampling phase that the remaining rolls can still cut, kept as a
+        swap-remove array. reset() filters the full pattern list against the order vector; after a
+        cut, drop_widths() removes in O(1) each pattern that now needs more rolls of a width than
+        are left, so every draw lands on a pattern that cuts something. The patterns of a width are
+        bucketed by the rolls of it one cut takes (1 to 3), and each bucket is walked once per
+        trial, when the width's rolls first fall below that count.
+    """
+
+    def __init__(self, patterns, divisors, widths):
+        self.patterns = np.asarray(patterns).tolist()
+        self.divisors = np.asarray(divisors).tolist()
+        self._pattern_array = np.asarray(patterns, dtype=int)
+        self._divisor_array = np.asarray(divisors, dtype=int)
+        # Width index -> rolls of the width one cut takes -> the patterns containing it that often
+        self._by_width = [{} for _ in range(widths)]
+        for p, (indices, pattern_divisors) in enumerate(zip(self.patterns, self.divisors)):
+            for i, divisor in dict(zip(indices, pattern_divisors)).items():
+                self._by_width[i].setdefault(divisor, []).append(p)
+        # Per width, the smallest bucket whose patterns are all inactive (4: none)
+        self._cleared = [4] * widths
+        self._active = []
+        self._position = [-1] * len(self.patterns)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def reset(self, order):
+        """Activate exactly the patterns the rolls in `order` allow at least one cut of"""
+        for p in self._active[:self._size]:
+            self._position[p] = -1
+        order = np.asarray(order)
+        self._cleared = np.minimum(order + 1, 4).tolist()
+        if len(self.patterns):
+            self._active = np.flatnonzero(
+                (order[self._pattern_array] >= self._divisor_array).all(axis=1)).tolist()
+        self._size = len(self._active)
+        for k, p in enumerate(self._active):
+            self._position[p] = k
+
+    def draw(self, u):
+        """The (indices, divisors) of the active pattern a uniform draw `u` in [0, 1) picks"""
+        p = self._active[int(u * self._size)]
+        return self.patterns[p], self.divisors[p]
+
+    def drop_widths(self, indices, order):
+        """Deactivate the patterns that need more rolls of any width in `indices` than `order` has left"""
+        for i in indices:
+            # No pattern takes more than 3 rolls of one width, so at 3 or more left nothing is dropped
+            left = order[i]
+            if left >= self._cleared[i] - 1:
+                continue
+            buckets = self._by_width[i]
+            for divisor in range(left + 1, self._cleared[i]):
+                for p in buckets.get(divisor, ()):
+                    if self._position[p] >= 0:
+                        self._remove(p)
+            self._cleared[i] = left + 1
+
+    def _remove(self, p):
+        k = self._position[p]
+        last = self._active[self._size - 1]
+        self._active[k] = last
+        self._position[last] = k
+        self._position[p] = -1
+        self._size -= 1
+
+
+def draw_indices(rng, n, size):
+    """Draw a block of `size` random indices into a pattern list of length n in one call"""
+    if n == 0:
+        return np.empty(0, dtype=int)
+    return rng.integers(0, n, size=size)
+
+
+def plan_result(order, ukuran, plan):
+    """
+        Build the standard result tuple from a pattern plan.
+        `plan` is a list of (machine, indices, count): machine 1 for PM1 or 2 for PM2,
+        indices the 2 or 3 width indices of the pattern, count the number of cuts.
+        Returns (ukuran_finaltrim_sisaorder, weight, detail_trim_PM1_PM2, cut_1)
+    """
+    ukuran = np.asarray(ukuran)
+    order = np.asarray(order)
+    used_pm1 = np.zeros(len(order))
+    used = np.zeros(len(order))
+    detail = PatternLog()
+    cut_1 = 0
+
+    for machine, indices, count in sorted(plan, key=lambda pattern: pattern[0]):
+        if count <= 0:
+            continue
+        row = []
+        for index in indices:
+            row += [ukuran[index], count]
+            used[index] += count
+            if machine == 1:
+                used_pm1[index] += count
+        detail.append(*row)
+        if machine == 1:
+            cut_1 += count
+
+    a = np.zeros((len(order), 6))
+    a[:, 0] = ukuran
+    a[:, 1] = used_pm1
+    a[:, 2] = order - used_pm1
+    a[:, 3] = ukuran
+    a[:, 4] = used
+    a[:, 5] = order - used
+
+    weight = np.sum(ukuran * a[:, 5]) * WEIGHT_CONSTANT
+    return a, weight, detail.to_array(), cut_1
+
+
+def candidate_patterns(ukuran, lebar_1, lebar_2, lebar_3):
+    """
+        List every distinct cutting pattern across both machines as (machine, indices).
+        PM1 cuts 2-out and 3-out at lebar_1, PM2 cuts 2-out at lebar_2 and 3-out at lebar_3;
+        a pattern that also fits PM1 is only listed for PM1.
+    """
+    patterns = []
+    seen = set()
+    for machine, size, lebar in [(1, 2, lebar_1), (1, 3, lebar_1), (2, 2, lebar_2), (2, 3, lebar_3)]:
+        if size == 2:
+            found = [pair for pair in feasible_pairs(ukuran, lebar).tolist() if pair[0] <= pair[1]]
+        else:
+            found = feasible_triples(ukuran, lebar)[0].tolist()
+        for indices in found:
+            key = tuple(sorted(indices))
+            if key not in seen:
+                seen.add(key)
+                patterns.append((machine, key))
+    return patterns
+
+
+def better_result(first, second):
+    """Return the better of two result tuples: lower weight, then more PM1 cuts (None results lose)"""
+    if first is None or first[0] is None:
+        return second
+    if second is None or second[0] is None:
+        return first
+    if second[1] < first[1] or (second[1] == first[1] and second[3] > first[3]):
+        return second
+    return first
+
+
+def detail_plan(detail, ukuran, lebar_1):
+    """
+        Read a detail_trim_PM1_PM2 array back into a list of (machine, indices, count).
+        Patterns that fit the PM1 window are assigned to PM1, the rest to PM2.
+        Raises KeyError when a row uses a width that is not in `ukuran`.
+    """
+    index_of = {width: i for i, width in enumerate(np.asarray(ukuran).tolist())}
+    plan = []
+    for row in np.asarray(detail, dtype=float).reshape(-1, 6).tolist():
+        widths = [row[k] for k in (0, 2, 4) if row[k]]
+        indices = tuple(sorted(index_of[width] for width in widths))
+        machine = 1 if lebar_1 - TRIM_WINDOW <= sum(widths) <= lebar_1 else 2
+        plan.append((machine, indices, int(round(row[1]))))
+    return plan
+
+
+def interrupted_result(best, anytime, info=None):
+    """
+        Result of an interrupted calculation: the best plan so far in anytime mode, else None
+        for every field. Marks `info['partial']` when given an info dict.
+    """
+    if info is not None:
+        info['partial'] = True
+    if anytime and best is not None and best[0] is not None:
+        return best
+    return None, None, None, None
@@ -0,0 +1,150 @@
+import multiprocessing
+import os
+import threading
+from parallel_trimming import open_worker_connection, process_job, process_substance
+from trimming_state import attach_shared_state, trimming_state
+
+# Workers are replaced after this many tasks, so leaks in long runs cannot build up
+SOLVE_POOL_MAX_TASKS = 50
+
+# Seconds a health check waits for an idle worker to answer before the pool is rebuilt
+HEALTH_CHECK_TIMEOUT = 10
+
+# Seconds a caller waits for one solve before giving up on it, so a task lost with a killed
+# worker fails its caller instead of blocking it forever
+SOLVE_TIMEOUT = 30 * 60
+
+
+def _init_solve_worker(generations, periodic_update_running):
+    attach_shared_state(generations, periodic_update_running)
+    open_worker_connection()
+
+
+def _ping(_=None):
+    return os.getpid()
+
+
+class SolvePool:
+    """
+        Long-lived worker processes that run every solve, both the periodic batch and the
+        request-triggered jobs, so solver CPU work never runs inside the web process.
+        Workers share the app's cancellation flags, keep one SQLite connection each and are
+        recycled after `max_tasks` tasks. The pool is started once (start) and health-checked
+        before each batch; a pool that stops answering is rebuilt.
+    """
+
+    def __init__(self, processes=None, max_tasks=SOLVE_POOL_MAX_TASKS):
+        self._processes = processes or multiprocessing.cpu_count()
+        self._max_tasks = max_tasks
+        self._lock = threading.Lock()
+        self._pool = None
+        # Pool -> tasks submitted to it that have not finished yet
+        self._in_flight = {}
+
+    def start(self):
+        """Create the workers up front and wait until each has started"""
+        pool = self._get_pool()
+        pool.map(_ping, range(self._processes), chunksize=1)
+        print(f"Solve pool started with {self._processes} workers")
+
+    def _create(self):
+        return multiprocessing.Pool(processes=self._processes, initializer=_init_solve_worker,
+                                    initargs=trimming_state.shared(), maxtasksperchild=self._max_tasks)
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = self._create()
+            return self._pool
+
+    def _track(self, pool, tasks):
+        with self._lock:
+            self._in_flight[pool] = self._in_flight.get(pool, 0) + tasks
+            if self._in_flight[pool] <= 0:
+                del self._in_flight[pool]
+
+    def healthy(self, timeout=HEALTH_CHECK_TIMEOUT):
+        """
+            True when the workers are alive. With every worker busy (a long exact or matching solve
+            cannot be interrupted) their processes only have to be running; otherwise an idle
+            worker has to answer a ping within `timeout` seconds
+        """
+        pool = self._get_pool()
+        with self._lock:
+            busy = self._in_flight.get(pool, 0) >= self._processes
+        try:
+            if busy:
+                # Pool keeps its worker processes in _pool; there is no public way to list them
+                return all(worker.is_alive() for worker in pool._pool)
+            pool.apply_async(_ping).get(timeout)
+            return True
+        except Exception as e:
+            print(f"Solve pool health check failed: {e!r}")
+            return False
+
+    def ensure_healthy(self):
+        """
+            Replace the pool when it fails a health check. An old pool with tasks still in flight is
+            only closed, so those tasks can finish and their callers get their results
+        """
+        if self.healthy():
+            return
+        with self._lock:
+            broken, self._pool = self._pool, self._create()
+            in_flight = self._in_flight.get(broken, 0)
+        if broken is not None and in_flight:
+            broken.close()
+            print(f"Solve pool replaced; the old pool finishes its {in_flight} tasks in flight")
+        elif broken is not None:
+            # Tearing down a wedged pool can block (e.g. a worker killed while holding the task
+            # queue lock), so it is left to a background thread
+            threading.Thread(target=broken.terminate, daemon=True).start()
+            print("Solve pool rebuilt")
+
+    def solve(self, substance_id, timeout=SOLVE_TIMEOUT, **options):
+        """
+            Solve one substance in a worker and wait for it; the waiting thread holds no GIL.
+            Raises multiprocessing.TimeoutError when no result comes within `timeout` seconds
+        """
+        pool = self._get_pool()
+        self._track(pool, 1)
+        try:
+            pool.apply_async(process_substance, (substance_id,), options).get(timeout)
+        finally:
+            self._track(pool, -1)
+
+    @property
+    def processes(self):
+        return self._processes
+
+    def solve_all(self, jobs):
+        """
+            Run (substance_id, options) jobs across the workers and wait for all of them.
+            Workers take one job at a time in the given order, so a caller that lists the
+            longest first keeps every worker busy until the end.
+        """
+        self.ensure_healthy()
+        jobs = list(jobs)
+        pool = self._get_pool()
+        remaining = len(jobs)
+        self._track(pool, remaining)
+        try:
+            results = pool.imap_unordered(process_job, jobs, chunksize=1)
+            while remaining:
+                results.next(SOLVE_TIMEOUT)
+                remaining -= 1
+                self._track(pool, -1)
+        finally:
+            # Jobs left after a timeout no longer have a waiter
+            self._track(pool, -remaining)
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool.join()
+                self._pool = None
+
+
+# Shared by the web routes and the periodic update
+solve_pool = SolvePool()
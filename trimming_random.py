@@ -1,17 +1,22 @@
+import multiprocessing
+import time
+
 import numpy as np
-from trimming_state import trimming_state
+from trimming_state import attach_shared_state, trimming_state
+from trimming_bound import meets_bound
+from trimming_greedy import trimming_greedy
+from trimming_local_search import local_search, split_time_budget
+from trimming_patterns import (ActivePatterns, better_result, feasible_pairs, feasible_triples, interrupted_result,
+                               pair_divisors, PatternLog, TRIPLE_DIVISORS, WEIGHT_CONSTANT)
 
 
 def check_interruption(substance_id):
     """Helper function to check if calculation should be interrupted"""
     try:
-        if substance_id is not None:
-            return (not trimming_state.is_processing(substance_id) or
-                    trimming_state.is_periodic_update_running())
+        return trimming_state.is_cancelled(substance_id)
     except Exception as e:
         print(f"Warning: Could not check interruption state: {e}")
         return False
-    return False
 
 def arrays_equal(arr1, arr2):
     """Compare two numpy arrays for equality, handling None values"""
@@ -19,16 +24,45 @@ def arrays_equal(arr1, arr2):
         return arr1 is arr2
     return np.array_equal(arr1, arr2)
 
-def trimming_random(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id=None):
+def trimming_random(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id=None, seed=None, warm_start=None,
+                    local_search_budget=1.0, iterations=30000, workers=1, shared_best=None,
+                    checkpoint_interval=2000, anytime=False, info=None, time_budget=None, lower_bound=None):
     """
         Modified trimming calculation with interrupt checks
+        Pass `seed` to reproduce a plan; each call draws from its own random Generator
+        With `workers` > 1 the iterations are split across that many processes (see trimming_random_multistart);
+        `shared_best` is the multiprocessing.Value those processes share their best weight through
+        The checkpoint early stop compares the best weight every `checkpoint_interval` iterations
+        The other options are described with ENGINES in trimming_engines
         Returns (ukuran_finaltrim_sisaorder_final, weight_final, detail_trim_PM1_PM2, cut_1_final)
     """
 
-    a = np.zeros((len(order), 6))
+    if workers > 1:
+        return trimming_random_multistart(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id, seed=seed,
+                                          warm_start=warm_start, local_search_budget=local_search_budget,
+                                          iterations=iterations, workers=workers, anytime=anytime, info=info,
+                                          time_budget=time_budget, lower_bound=lower_bound)
+
     weight_final = float('inf')
-    weight_constant = 3 / 385
     orderan = order.copy()
+    rng = np.random.default_rng(seed)
+
+    # Feasible 2-out patterns per machine width, so the 2-out phases only draw valid pairs
+    pairs_1 = feasible_pairs(ukuran, lebar_1)
+    pairs_2 = feasible_pairs(ukuran, lebar_2)
+
+    # Feasible 3-out patterns, with the per-slot divisors of their multiplicity class
+    triples_1, classes_1 = feasible_triples(ukuran, lebar_1)
+    triples_2, classes_2 = feasible_triples(ukuran, lebar_3)
+    divisors_1 = TRIPLE_DIVISORS[classes_1]
+    divisors_2 = TRIPLE_DIVISORS[classes_2]
+
+    # Each phase draws only from the patterns the remaining rolls still allow; a phase refilters
+    # its list when it starts and drops patterns as their widths run out, and ends once none is left
+    active_pairs_1 = ActivePatterns(pairs_1, pair_divisors(pairs_1), len(ukuran))
+    active_triples_1 = ActivePatterns(triples_1, divisors_1, len(ukuran))
+    active_pairs_2 = ActivePatterns(pairs_2, pair_divisors(pairs_2), len(ukuran))
+    active_triples_2 = ActivePatterns(triples_2, divisors_2, len(ukuran))
 
     # Initialize trim_detail_final
     trim_detail_final = np.empty((0, 6))
@@ -36,12 +70,9 @@ def trimming_random(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id=None)
     ukuran_finaltrim_sisaorder_final = None
 
     # Variables for weight checkpoint optimization
-    checkpoint_interval = 2000  # Check every 2000 iterations
     best_weights_history = []  # Store best weights for each checkpoint
-    current_checkpoint_best = float('inf')
 
     # Variables for optimization checks
-    last_five_results = []  # Store last 5 trim detail results
     best_results = {
         'weight': float('inf'),
         'details': None,
@@ -49,26 +80,67 @@ def trimming_random(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id=None)
         'cut_1': 0
     }
     consecutive_same_results = 0
-    last_detail = None
 
-    for z in range(30000):
+    # Seed the best plan before the random loop, so random trials only replace it when they beat it
+    warm_start = better_result(trimming_greedy(orderan, ukuran, lebar_1, lebar_2, lebar_3), warm_start)
+    ukuran_finaltrim_sisaorder_final, weight_final, trim_detail_final, cut_1_final = warm_start
+    best_results['weight'] = weight_final
+    best_results['details'] = trim_detail_final
+    best_results['ukuran_final'] = ukuran_finaltrim_sisaorder_final
+    best_results['cut_1'] = cut_1_final
+
+    # Checkpoint windows start from the seeded best, so the checkpoint early stop fires as soon
+    # as the random trials stop improving on it
+    current_checkpoint_best = weight_final
+    _share_best(shared_best, weight_final)
+    if info is not None:
+        info.update(partial=False, iterations=0, truncated=False)
+
+    # Two reusable pattern logs: the current trial writes into trim_detail while
+    # last_detail keeps the previous trial's rows; they swap at the start of each trial
+    trim_detail = PatternLog()
+    last_detail = PatternLog()
+
+    # Cancellation is checked before each 1000-step phase rather than on every step, which
+    # bounds the latency to one phase while keeping the check out of the inner loops
+    cancel = trimming_state.cancellation_token(substance_id)
+    search_budget, local_search_budget = split_time_budget(time_budget, local_search_budget)
+    stop_at = time.monotonic() + search_budget if search_budget is not None else None
+
+    for z in range(iterations):
+        if stop_at is not None and time.monotonic() >= stop_at:
+            print(f"Time budget reached at iteration {z}")
+            if info is not None:
+                info['truncated'] = True
+            break
+
+        # No plan can beat one that reaches the lower bound; multi-start workers stop on any worker's best
+        best_so_far = weight_final if shared_best is None else min(weight_final, shared_best.value)
+        if meets_bound(best_so_far, lower_bound):
+            print(f"Early stop: best weight {best_so_far} meets the lower bound at iteration {z}")
+            break
+
         # Check for interrupts
-        if check_interruption(substance_id):
+        if cancel.cancelled():
             print(f"Trimming calculation interrupted for substance {substance_id}")
-            return None, None, None, None
+            return interrupted_result((ukuran_finaltrim_sisaorder_final, weight_final, trim_detail_final, cut_1_final),
+                                      anytime, info)
 
         order = orderan.copy()
         trim = np.zeros(len(order))
         a = np.zeros((len(order), 6))
-        trim_detail = np.empty((0, 6))  # Initialize with 12 columns
+        trim_detail, last_detail = last_detail, trim_detail
+        trim_detail.clear()
         x = 0
         cut_1 = 0
 
         # Trim Random PM1 (2 Out)
-        for r in range(1000):
-            randomizer_1 = np.random.randint(0, len(order))
-            randomizer_2 = np.random.randint(0, len(order))
-            if lebar_1 - 12 <= ukuran[randomizer_2] + ukuran[randomizer_1] <= lebar_1 and randomizer_1 != randomizer_2:
+        active_pairs_1.reset(order)
+        for draw in rng.random(1000).tolist():
+            if not active_pairs_1:
+                break
+            (randomizer_1, randomizer_2), _ = active_pairs_1.draw(draw)
+            if randomizer_1 != randomizer_2:
                 substract = min(order[randomizer_2], order[randomizer_1])
                 order[randomizer_2] -= substract
                 order[randomizer_1] -= substract
@@ -76,19 +148,16 @@ def trimming_random(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id=None)
                 trim[randomizer_1] += substract
                 if substract != 0:
                     x += 1
-                    trim_detail = np.vstack(
-                        [trim_detail, [ukuran[randomizer_2], substract, ukuran[randomizer_1], substract,0,0]])
+                    trim_detail.append(ukuran[randomizer_2], substract, ukuran[randomizer_1], substract)
                 cut_1 += substract
-            elif lebar_1 - 12 <= ukuran[randomizer_2] + ukuran[
-                randomizer_1] <= lebar_1 and randomizer_1 == randomizer_2:
+            else:
                 if order[randomizer_2] % 2 == 0:
                     substract = min(order[randomizer_2], order[randomizer_1])
                     order[randomizer_2] -= substract
                     trim[randomizer_2] += substract
                     if substract != 0:
                         x += 1
-                        trim_detail = np.vstack(
-                            [trim_detail, [ukuran[randomizer_2], substract / 2, ukuran[randomizer_2], substract / 2,0,0]])
+                        trim_detail.append(ukuran[randomizer_2], substract / 2, ukuran[randomizer_2], substract / 2)
                     cut_1 += substract / 2
                 elif order[randomizer_2] % 2 == 1:
                     substract = min(order[randomizer_2], order[randomizer_1])
@@ -96,265 +165,37 @@ def trimming_random(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id=None)
                     trim[randomizer_2] += (substract - 1)
                     if substract != 0 and substract != 1:
                         x += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_2], (substract - 1) / 2, ukuran[randomizer_2],
-                                                  (substract - 1) / 2,0,0]])
+                        trim_detail.append(ukuran[randomizer_2], (substract - 1) / 2,
+                                           ukuran[randomizer_2], (substract - 1) / 2)
                     cut_1 += (substract - 1) / 2
+            active_pairs_1.drop_widths((randomizer_1, randomizer_2), order)
+
+        if cancel.cancelled():
+            print(f"Trimming calculation interrupted for substance {substance_id}")
+            return interrupted_result((ukuran_finaltrim_sisaorder_final, weight_final, trim_detail_final, cut_1_final),
+                                      anytime, info)
 
         # Trim Random PM1 (3 Out)
-        for i in range(1000):
-            if not trimming_state.is_processing(substance_id) or \
-                    trimming_state.is_periodic_update_running():
-                print(f"Trimming calculation interrupted for substance {substance_id}")
-                return None, None, None, None
-
-            randomizer_3 = np.random.randint(0, len(order))
-            randomizer_4 = np.random.randint(0, len(order))
-            randomizer_5 = np.random.randint(0, len(order))
-            if (lebar_1 - 12 <= ukuran[randomizer_3] + ukuran[randomizer_4] + ukuran[randomizer_5] <= lebar_1 and
-                    randomizer_3 != randomizer_4 and randomizer_3 != randomizer_5 and randomizer_5 != randomizer_4 and
-                    order[randomizer_3] > 0 and order[randomizer_4] > 0 and order[randomizer_5] > 0):
-                substract = min(order[randomizer_3], order[randomizer_4], order[randomizer_5])
+        active_triples_1.reset(order)
+        for draw in rng.random(1000).tolist():
+            if not active_triples_1:
+                break
+            (randomizer_3, randomizer_4, randomizer_5), (divisor_3, divisor_4, divisor_5) = \
+                active_triples_1.draw(draw)
+            substract = min(order[randomizer_3] // divisor_3, order[randomizer_4] // divisor_4,
+                            order[randomizer_5] // divisor_5)
+            if substract != 0:
                 order[randomizer_3] -= substract
                 order[randomizer_4] -= substract
                 order[randomizer_5] -= substract
                 trim[randomizer_3] += substract
                 trim[randomizer_4] += substract
                 trim[randomizer_5] += substract
-                if substract != 0:
-                    x += 1
-                    trim_detail = np.vstack([trim_detail,
-                                             [ukuran[randomizer_3], substract, ukuran[randomizer_4], substract,
-                                              ukuran[randomizer_5], substract]])
+                x += 1
+                trim_detail.append(ukuran[randomizer_3], substract, ukuran[randomizer_4], substract,
+                                   ukuran[randomizer_5], substract)
                 cut_1 += substract
-            elif (lebar_1 - 12 <= ukuran[randomizer_3] + ukuran[randomizer_4] + ukuran[randomizer_5] <= lebar_1 and
-                  randomizer_3 != randomizer_4 and randomizer_3 != randomizer_5 and randomizer_5 == randomizer_4 and
-                  order[randomizer_3] > 0 and order[randomizer_4] > 0 and order[randomizer_5] > 0):
-                if order[randomizer_5] / 2 >= order[randomizer_3]:
-                    substract = min(order[randomizer_3], order[randomizer_5])
-                    order[randomizer_5] -= substract * 2
-                    trim[randomizer_5] += substract * 2
-                    order[randomizer_3] -= substract
-                    trim[randomizer_3] += substract
-                    if substract != 0:
-                        x += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_3], substract, ukuran[randomizer_4], substract,
-                                                  ukuran[randomizer_5], substract]])
-                    cut_1 += substract
-                elif order[randomizer_5] / 2 < order[randomizer_3] <= order[randomizer_5] and order[
-                    randomizer_5] % 2 == 0:
-                    substract = max(order[randomizer_3], order[randomizer_5])
-                    order[randomizer_5] -= substract
-                    trim[randomizer_5] += substract
-                    order[randomizer_3] -= substract / 2
-                    trim[randomizer_3] += substract / 2
-                    if substract != 0:
-                        x += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_3], substract / 2, ukuran[randomizer_4],
-                                                  substract / 2, ukuran[randomizer_5], substract / 2]])
-                    cut_1 += substract / 2
-                elif order[randomizer_5] / 2 < order[randomizer_3] <= order[randomizer_5] and order[
-                    randomizer_5] % 2 == 1:
-                    substract = max(order[randomizer_3], order[randomizer_5])
-                    order[randomizer_5] -= (substract - 1)
-                    trim[randomizer_5] += (substract - 1)
-                    order[randomizer_3] -= (substract - 1) / 2
-                    trim[randomizer_3] += (substract - 1) / 2
-                    if substract != 0 and substract != 1:
-                        x += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_3], (substract - 1) / 2, ukuran[randomizer_4],
-                                                  (substract - 1) / 2, ukuran[randomizer_5], (substract - 1) / 2]])
-                    cut_1 += (substract - 1) / 2
-                elif order[randomizer_5] < order[randomizer_3] and order[randomizer_5] % 2 == 0:
-                    substract = min(order[randomizer_3], order[randomizer_5])
-                    order[randomizer_5] -= substract
-                    trim[randomizer_5] += substract
-                    order[randomizer_3] -= substract / 2
-                    trim[randomizer_3] += substract / 2
-                    if substract != 0:
-                        x += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_3], substract / 2, ukuran[randomizer_4],
-                                                  substract / 2, ukuran[randomizer_5], substract / 2]])
-                    cut_1 += substract / 2
-                elif order[randomizer_5] < order[randomizer_3] and order[randomizer_5] % 2 == 1:
-                    substract = min(order[randomizer_3], order[randomizer_5])
-                    order[randomizer_5] -= (substract - 1)
-                    trim[randomizer_5] += (substract - 1)
-                    order[randomizer_3] -= (substract - 1) / 2
-                    trim[randomizer_3] += (substract - 1) / 2
-                    if substract != 0 and substract != 1:
-                        x += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_3], (substract - 1) / 2, ukuran[randomizer_4],
-                                                  (substract - 1) / 2, ukuran[randomizer_5], (substract - 1) / 2]])
-                    cut_1 += (substract - 1) / 2
-            elif (lebar_1 - 12 <= ukuran[randomizer_3] + ukuran[randomizer_4] + ukuran[randomizer_5] <= lebar_1 and
-                  randomizer_3 != randomizer_4 and randomizer_3 == randomizer_5 and randomizer_5 != randomizer_4 and
-                  order[randomizer_3] > 0 and order[randomizer_4] > 0 and order[randomizer_5] > 0):
-                if order[randomizer_3] / 2 >= order[randomizer_4]:
-                    substract = min(order[randomizer_3], order[randomizer_4])
-                    order[randomizer_3] -= substract * 2
-                    trim[randomizer_3] += substract * 2
-                    order[randomizer_4] -= substract
-                    trim[randomizer_4] += substract
-                    if substract != 0:
-                        x += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_3], substract, ukuran[randomizer_4], substract,
-                                                  ukuran[randomizer_5], substract]])
-                    cut_1 += substract
-                elif order[randomizer_3] / 2 < order[randomizer_4] <= order[randomizer_3] and order[
-                    randomizer_3] % 2 == 0:
-                    substract = max(order[randomizer_3], order[randomizer_4])
-                    order[randomizer_3] -= substract
-                    trim[randomizer_3] += substract
-                    order[randomizer_4] -= substract / 2
-                    trim[randomizer_4] += substract / 2
-                    if substract != 0:
-                        x += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_3], substract / 2, ukuran[randomizer_4],
-                                                  substract / 2, ukuran[randomizer_5], substract / 2]])
-                    cut_1 += substract / 2
-                elif order[randomizer_3] / 2 < order[randomizer_4] <= order[randomizer_3] and order[
-                    randomizer_3] % 2 == 1:
-                    substract = max(order[randomizer_3], order[randomizer_4])
-                    order[randomizer_3] -= (substract - 1)
-                    trim[randomizer_3] += (substract - 1)
-                    order[randomizer_4] -= (substract - 1) / 2
-                    trim[randomizer_4] += (substract - 1) / 2
-                    if substract != 0 and substract != 1:
-                        x += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_3], (substract - 1) / 2, ukuran[randomizer_4],
-                                                  (substract - 1) / 2, ukuran[randomizer_5], (substract - 1) / 2]])
-                    cut_1 += (substract - 1) / 2
-                elif order[randomizer_3] < order[randomizer_4] and order[randomizer_3] % 2 == 0:
-                    substract = min(order[randomizer_3], order[randomizer_4])
-                    order[randomizer_3] -= substract
-                    trim[randomizer_3] += substract
-                    order[randomizer_4] -= substract / 2
-                    trim[randomizer_4] += substract / 2
-                    if substract != 0:
-                        x += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_3], substract / 2, ukuran[randomizer_4],
-                                                  substract / 2, ukuran[randomizer_5], substract / 2]])
-                    cut_1 += substract / 2
-                elif order[randomizer_3] < order[randomizer_4] and order[randomizer_3] % 2 == 1:
-                    substract = min(order[randomizer_3], order[randomizer_4])
-                    order[randomizer_3] -= (substract - 1)
-                    trim[randomizer_3] += (substract - 1)
-                    order[randomizer_4] -= (substract - 1) / 2
-                    trim[randomizer_4] += (substract - 1) / 2
-                    if substract != 0 and substract != 1:
-                        x += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_3], (substract - 1) / 2, ukuran[randomizer_4],
-                                                  (substract - 1) / 2, ukuran[randomizer_5], (substract - 1) / 2]])
-                    cut_1 += (substract - 1) / 2
-            elif (lebar_1 - 12 <= ukuran[randomizer_3] + ukuran[randomizer_4] + ukuran[randomizer_5] <= lebar_1 and
-                  randomizer_3 == randomizer_4 and randomizer_3 != randomizer_5 and randomizer_5 != randomizer_4 and
-                  order[randomizer_3] > 0 and order[randomizer_4] > 0 and order[randomizer_5] > 0):
-                if order[randomizer_3] / 2 >= order[randomizer_5]:
-                    substract = min(order[randomizer_3], order[randomizer_5])
-                    order[randomizer_3] -= substract * 2
-                    trim[randomizer_3] += substract * 2
-                    order[randomizer_5] -= substract
-                    trim[randomizer_5] += substract
-                    if substract != 0:
-                        x += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_3], substract, ukuran[randomizer_4], substract,
-                                                  ukuran[randomizer_5], substract]])
-                    cut_1 += substract
-                elif order[randomizer_3] / 2 < order[randomizer_5] <= order[randomizer_3] and order[
-                    randomizer_3] % 2 == 0:
-                    substract = max(order[randomizer_3], order[randomizer_5])
-                    order[randomizer_3] -= substract
-                    trim[randomizer_3] += substract
-                    order[randomizer_5] -= substract / 2
-                    trim[randomizer_5] += substract / 2
-                    if substract != 0:
-                        x += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_3], substract / 2, ukuran[randomizer_4],
-                                                  substract / 2, ukuran[randomizer_5], substract / 2]])
-                    cut_1 += substract / 2
-                elif order[randomizer_3] / 2 < order[randomizer_5] <= order[randomizer_3] and order[
-                    randomizer_3] % 2 == 1:
-                    substract = max(order[randomizer_3], order[randomizer_5])
-                    order[randomizer_3] -= (substract - 1)
-                    trim[randomizer_3] += (substract - 1)
-                    order[randomizer_5] -= (substract - 1) / 2
-                    trim[randomizer_5] += (substract - 1) / 2
-                    if substract != 0 and substract != 1:
-                        x += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_3], (substract - 1) / 2, ukuran[randomizer_4],
-                                                  (substract - 1) / 2, ukuran[randomizer_5], (substract - 1) / 2]])
-                    cut_1 += (substract - 1) / 2
-                elif order[randomizer_3] < order[randomizer_5] and order[randomizer_3] % 2 == 0:
-                    substract = min(order[randomizer_3], order[randomizer_5])
-                    order[randomizer_3] -= substract
-                    trim[randomizer_3] += substract
-                    order[randomizer_5] -= substract / 2
-                    trim[randomizer_5] += substract / 2
-                    if substract != 0:
-                        x += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_3], substract / 2, ukuran[randomizer_4],
-                                                  substract / 2, ukuran[randomizer_5], substract / 2]])
-                    cut_1 += substract / 2
-                elif order[randomizer_3] < order[randomizer_5] and order[randomizer_3] % 2 == 1:
-                    substract = min(order[randomizer_3], order[randomizer_5])
-                    order[randomizer_3] -= (substract - 1)
-                    trim[randomizer_3] += (substract - 1)
-                    order[randomizer_5] -= (substract - 1) / 2
-                    trim[randomizer_5] += (substract - 1) / 2
-                    if substract != 0 and substract != 1:
-                        x += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_3], (substract - 1) / 2, ukuran[randomizer_4],
-                                                  (substract - 1) / 2, ukuran[randomizer_5], (substract - 1) / 2]])
-                    cut_1 += (substract - 1) / 2
-            elif (lebar_1 - 12 <= ukuran[randomizer_3] + ukuran[randomizer_4] + ukuran[randomizer_5] <= lebar_1 and
-                  randomizer_3 == randomizer_4 and randomizer_3 == randomizer_5 and randomizer_5 == randomizer_4 and
-                  order[randomizer_3] > 0 and order[randomizer_4] > 0 and order[randomizer_5] > 0):
-                if order[randomizer_3] % 3 == 0:
-                    substract = min(order[randomizer_3], order[randomizer_4], order[randomizer_5])
-                    order[randomizer_3] -= substract
-                    trim[randomizer_3] += substract
-                    if substract != 0:
-                        x += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_3], substract / 3, ukuran[randomizer_4],
-                                                  substract / 3, ukuran[randomizer_5], substract / 3]])
-                    cut_1 += substract / 3
-                elif order[randomizer_3] % 3 == 1:
-                    substract = min(order[randomizer_3], order[randomizer_4], order[randomizer_5])
-                    order[randomizer_3] -= (substract - 1)
-                    trim[randomizer_3] += (substract - 1)
-                    if substract != 0 and substract != 1:
-                        x += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_3], (substract - 1) / 3, ukuran[randomizer_4],
-                                                  (substract - 1) / 3, ukuran[randomizer_5], (substract - 1) / 3]])
-                    cut_1 += (substract - 1) / 3
-                elif order[randomizer_3] % 3 == 2:
-                    substract = min(order[randomizer_3], order[randomizer_4], order[randomizer_5])
-                    order[randomizer_3] -= (substract - 2)
-                    trim[randomizer_3] += (substract - 2)
-                    if substract != 0 and substract != 2:
-                        x += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_3], (substract - 2) / 3, ukuran[randomizer_4],
-                                                  (substract - 2) / 3, ukuran[randomizer_5], (substract - 2) / 3]])
-                    cut_1 += (substract - 2) / 3
+                active_triples_1.drop_widths((randomizer_3, randomizer_4, randomizer_5), order)
 
         a[:, 0] = ukuran
         a[:, 1] = trim
@@ -366,16 +207,18 @@ def trimming_random(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id=None)
         x_2 = 0
         cut_2 = 0
 
+        if cancel.cancelled():
+            print(f"Trimming calculation interrupted for substance {substance_id}")
+            return interrupted_result((ukuran_finaltrim_sisaorder_final, weight_final, trim_detail_final, cut_1_final),
+                                      anytime, info)
+
         # Trim Random PM2 (2 Out)
-        for y in range(1000):
-            if not trimming_state.is_processing(substance_id) or \
-                    trimming_state.is_periodic_update_running():
-                print(f"Trimming calculation interrupted for substance {substance_id}")
-                return None, None, None, None
-
-            randomizer_6 = np.random.randint(0, len(order_2))
-            randomizer_7 = np.random.randint(0, len(order_2))
-            if lebar_2 - 12 <= ukuran[randomizer_7] + ukuran[randomizer_6] <= lebar_2 and randomizer_6 != randomizer_7:
+        active_pairs_2.reset(order_2)
+        for draw in rng.random(1000).tolist():
+            if not active_pairs_2:
+                break
+            (randomizer_6, randomizer_7), _ = active_pairs_2.draw(draw)
+            if randomizer_6 != randomizer_7:
                 substract = min(order_2[randomizer_7], order_2[randomizer_6])
                 order_2[randomizer_7] -= substract
                 order_2[randomizer_6] -= substract
@@ -383,20 +226,16 @@ def trimming_random(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id=None)
                 trim_2[randomizer_6] += substract
                 if substract != 0:
                     x_2 += 1
-                    trim_detail = np.vstack([trim_detail,
-                                             [ukuran[randomizer_7], substract, ukuran[randomizer_6],
-                                              substract, 0, 0]])
+                    trim_detail.append(ukuran[randomizer_7], substract, ukuran[randomizer_6], substract)
                 cut_2 += substract
-            elif lebar_2 - 12 <= ukuran[randomizer_7] + ukuran[
-                randomizer_6] <= lebar_2 and randomizer_6 == randomizer_7:
+            else:
                 if order_2[randomizer_7] % 2 == 0:
                     substract = order_2[randomizer_7]
                     order_2[randomizer_7] -= substract
                     trim_2[randomizer_7] += substract
                     if substract != 0:
                         x_2 += 1
-                        trim_detail = np.vstack([trim_detail, [ukuran[randomizer_7], substract / 2,
-                                                               ukuran[randomizer_7], substract / 2, 0, 0]])
+                        trim_detail.append(ukuran[randomizer_7], substract / 2, ukuran[randomizer_7], substract / 2)
                     cut_2 += substract / 2
                 elif order_2[randomizer_7] % 2 == 1:
                     substract = order_2[randomizer_7]
@@ -404,265 +243,37 @@ def trimming_random(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id=None)
                     trim_2[randomizer_7] += (substract - 1)
                     if substract != 0 and substract != 1:
                         x_2 += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_7], (substract - 1) / 2,
-                                                  ukuran[randomizer_7], (substract - 1) / 2, 0, 0]])
+                        trim_detail.append(ukuran[randomizer_7], (substract - 1) / 2,
+                                           ukuran[randomizer_7], (substract - 1) / 2)
                     cut_2 += (substract - 1) / 2
+            active_pairs_2.drop_widths((randomizer_6, randomizer_7), order_2)
+
+        if cancel.cancelled():
+            print(f"Trimming calculation interrupted for substance {substance_id}")
+            return interrupted_result((ukuran_finaltrim_sisaorder_final, weight_final, trim_detail_final, cut_1_final),
+                                      anytime, info)
 
         # Trim Random PM2 (3 Out)
-        for k in range(1000):
-            if not trimming_state.is_processing(substance_id) or \
-                    trimming_state.is_periodic_update_running():
-                print(f"Trimming calculation interrupted for substance {substance_id}")
-                return None, None, None, None
-
-            randomizer_8 = np.random.randint(0, len(order_2))
-            randomizer_9 = np.random.randint(0, len(order_2))
-            randomizer_10 = np.random.randint(0, len(order_2))
-            if (lebar_3 - 12 <= ukuran[randomizer_8] + ukuran[randomizer_9] + ukuran[randomizer_10] <= lebar_3 and
-                    randomizer_8 != randomizer_9 and randomizer_8 != randomizer_10 and randomizer_10 != randomizer_9 and
-                    order_2[randomizer_8] > 0 and order_2[randomizer_9] > 0 and order_2[randomizer_10] > 0):
-                substract = min(order_2[randomizer_8], order_2[randomizer_9], order_2[randomizer_10])
+        active_triples_2.reset(order_2)
+        for draw in rng.random(1000).tolist():
+            if not active_triples_2:
+                break
+            (randomizer_8, randomizer_9, randomizer_10), (divisor_8, divisor_9, divisor_10) = \
+                active_triples_2.draw(draw)
+            substract = min(order_2[randomizer_8] // divisor_8, order_2[randomizer_9] // divisor_9,
+                            order_2[randomizer_10] // divisor_10)
+            if substract != 0:
                 order_2[randomizer_8] -= substract
                 order_2[randomizer_9] -= substract
                 order_2[randomizer_10] -= substract
                 trim_2[randomizer_8] += substract
                 trim_2[randomizer_9] += substract
                 trim_2[randomizer_10] += substract
-                if substract != 0:
-                    x_2 += 1
-                    trim_detail = np.vstack([trim_detail,
-                                             [ukuran[randomizer_8], substract, ukuran[randomizer_9], substract,
-                                              ukuran[randomizer_10], substract]])
+                x_2 += 1
+                trim_detail.append(ukuran[randomizer_8], substract, ukuran[randomizer_9], substract,
+                                   ukuran[randomizer_10], substract)
                 cut_2 += substract
-            elif (lebar_3 - 12 <= ukuran[randomizer_8] + ukuran[randomizer_9] + ukuran[randomizer_10] <= lebar_3 and
-                  randomizer_8 != randomizer_9 and randomizer_8 != randomizer_10 and randomizer_10 == randomizer_9 and
-                  order_2[randomizer_8] > 0 and order_2[randomizer_9] > 0 and order_2[randomizer_10] > 0):
-                if order_2[randomizer_10] / 2 >= order_2[randomizer_8]:
-                    substract = min(order_2[randomizer_8], order_2[randomizer_10])
-                    order_2[randomizer_10] -= substract * 2
-                    trim_2[randomizer_10] += substract * 2
-                    order_2[randomizer_8] -= substract
-                    trim_2[randomizer_8] += substract
-                    if substract != 0:
-                        x_2 += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_8], substract, ukuran[randomizer_9], substract,
-                                                  ukuran[randomizer_10], substract]])
-                    cut_2 += substract
-                elif order_2[randomizer_10] / 2 < order_2[randomizer_8] <= order_2[randomizer_10] and order_2[
-                    randomizer_10] % 2 == 0:
-                    substract = max(order_2[randomizer_8], order_2[randomizer_10])
-                    order_2[randomizer_10] -= substract
-                    trim_2[randomizer_10] += substract
-                    order_2[randomizer_8] -= substract / 2
-                    trim_2[randomizer_8] += substract / 2
-                    if substract != 0:
-                        x_2 += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_8], substract / 2, ukuran[randomizer_9],
-                                                  substract / 2, ukuran[randomizer_10], substract / 2]])
-                    cut_2 += substract / 2
-                elif order_2[randomizer_10] / 2 < order_2[randomizer_8] <= order_2[randomizer_10] and order_2[
-                    randomizer_10] % 2 == 1:
-                    substract = max(order_2[randomizer_8], order_2[randomizer_10])
-                    order_2[randomizer_10] -= (substract - 1)
-                    trim_2[randomizer_10] += (substract - 1)
-                    order_2[randomizer_8] -= (substract - 1) / 2
-                    trim_2[randomizer_8] += (substract - 1) / 2
-                    if substract != 0 and substract != 1:
-                        x_2 += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_8], (substract - 1) / 2, ukuran[randomizer_9],
-                                                  (substract - 1) / 2, ukuran[randomizer_10], (substract - 1) / 2]])
-                    cut_2 += (substract - 1) / 2
-                elif order_2[randomizer_10] < order_2[randomizer_8] and order_2[randomizer_10] % 2 == 0:
-                    substract = min(order_2[randomizer_8], order_2[randomizer_10])
-                    order_2[randomizer_10] -= substract
-                    trim_2[randomizer_10] += substract
-                    order_2[randomizer_8] -= substract / 2
-                    trim_2[randomizer_8] += substract / 2
-                    if substract != 0:
-                        x_2 += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_8], substract / 2, ukuran[randomizer_9],
-                                                  substract / 2, ukuran[randomizer_10], substract / 2]])
-                    cut_2 += substract / 2
-                elif order_2[randomizer_10] < order_2[randomizer_8] and order_2[randomizer_10] % 2 == 1:
-                    substract = min(order_2[randomizer_8], order_2[randomizer_10])
-                    order_2[randomizer_10] -= (substract - 1)
-                    trim_2[randomizer_10] += (substract - 1)
-                    order_2[randomizer_8] -= (substract - 1) / 2
-                    trim_2[randomizer_8] += (substract - 1) / 2
-                    if substract != 0 and substract != 1:
-                        x_2 += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_8], (substract - 1) / 2, ukuran[randomizer_9],
-                                                  (substract - 1) / 2, ukuran[randomizer_10], (substract - 1) / 2]])
-                    cut_2 += (substract - 1) / 2
-            elif (lebar_3 - 12 <= ukuran[randomizer_8] + ukuran[randomizer_9] + ukuran[randomizer_10] <= lebar_3 and
-                  randomizer_8 != randomizer_9 and randomizer_8 == randomizer_10 and randomizer_10 != randomizer_9 and
-                  order_2[randomizer_8] > 0 and order_2[randomizer_9] > 0 and order_2[randomizer_10] > 0):
-                if order_2[randomizer_8] / 2 >= order_2[randomizer_9]:
-                    substract = min(order_2[randomizer_8], order_2[randomizer_9])
-                    order_2[randomizer_8] -= substract * 2
-                    trim_2[randomizer_8] += substract * 2
-                    order_2[randomizer_9] -= substract
-                    trim_2[randomizer_9] += substract
-                    if substract != 0:
-                        x_2 += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_8], substract, ukuran[randomizer_9], substract,
-                                                  ukuran[randomizer_10], substract]])
-                    cut_2 += substract
-                elif order_2[randomizer_8] / 2 < order_2[randomizer_9] <= order_2[randomizer_8] and order_2[
-                    randomizer_8] % 2 == 0:
-                    substract = max(order_2[randomizer_8], order_2[randomizer_9])
-                    order_2[randomizer_8] -= substract
-                    trim_2[randomizer_8] += substract
-                    order_2[randomizer_9] -= substract / 2
-                    trim_2[randomizer_9] += substract / 2
-                    if substract != 0:
-                        x_2 += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_8], substract / 2, ukuran[randomizer_9],
-                                                  substract / 2, ukuran[randomizer_10], substract / 2]])
-                    cut_2 += substract / 2
-                elif order_2[randomizer_8] / 2 < order_2[randomizer_9] <= order_2[randomizer_8] and order_2[
-                    randomizer_8] % 2 == 1:
-                    substract = max(order_2[randomizer_8], order_2[randomizer_9])
-                    order_2[randomizer_8] -= (substract - 1)
-                    trim_2[randomizer_8] += (substract - 1)
-                    order_2[randomizer_9] -= (substract - 1) / 2
-                    trim_2[randomizer_9] += (substract - 1) / 2
-                    if substract != 0 and substract != 1:
-                        x_2 += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_8], (substract - 1) / 2, ukuran[randomizer_9],
-                                                  (substract - 1) / 2, ukuran[randomizer_10], (substract - 1) / 2]])
-                    cut_2 += (substract - 1) / 2
-                elif order_2[randomizer_8] < order_2[randomizer_9] and order_2[randomizer_8] % 2 == 0:
-                    substract = min(order_2[randomizer_8], order_2[randomizer_9])
-                    order_2[randomizer_8] -= substract
-                    trim_2[randomizer_8] += substract
-                    order_2[randomizer_9] -= substract / 2
-                    trim_2[randomizer_9] += substract / 2
-                    if substract != 0:
-                        x_2 += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_8], substract / 2, ukuran[randomizer_9],
-                                                  substract / 2, ukuran[randomizer_10], substract / 2]])
-                    cut_2 += substract / 2
-                elif order_2[randomizer_8] < order_2[randomizer_9] and order_2[randomizer_8] % 2 == 1:
-                    substract = min(order_2[randomizer_8], order_2[randomizer_9])
-                    order_2[randomizer_8] -= (substract - 1)
-                    trim_2[randomizer_8] += (substract - 1)
-                    order_2[randomizer_9] -= (substract - 1) / 2
-                    trim_2[randomizer_9] += (substract - 1) / 2
-                    if substract != 0 and substract != 1:
-                        x_2 += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_8], (substract - 1) / 2, ukuran[randomizer_9],
-                                                  (substract - 1) / 2, ukuran[randomizer_10], (substract - 1) / 2]])
-                    cut_2 += (substract - 1) / 2
-            elif (lebar_3 - 12 <= ukuran[randomizer_8] + ukuran[randomizer_9] + ukuran[randomizer_10] <= lebar_3 and
-                  randomizer_8 == randomizer_9 and randomizer_8 != randomizer_10 and randomizer_10 != randomizer_9 and
-                  order_2[randomizer_8] > 0 and order_2[randomizer_9] > 0 and order_2[randomizer_10] > 0):
-                if order_2[randomizer_8] / 2 >= order_2[randomizer_10]:
-                    substract = min(order_2[randomizer_8], order_2[randomizer_10])
-                    order_2[randomizer_8] -= substract * 2
-                    trim_2[randomizer_8] += substract * 2
-                    order_2[randomizer_10] -= substract
-                    trim_2[randomizer_10] += substract
-                    if substract != 0:
-                        x_2 += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_8], substract, ukuran[randomizer_9], substract,
-                                                  ukuran[randomizer_10], substract]])
-                    cut_2 += substract
-                elif order_2[randomizer_8] / 2 < order_2[randomizer_10] <= order_2[randomizer_8] and order_2[
-                    randomizer_8] % 2 == 0:
-                    substract = max(order_2[randomizer_8], order_2[randomizer_10])
-                    order_2[randomizer_8] -= substract
-                    trim_2[randomizer_8] += substract
-                    order_2[randomizer_10] -= substract / 2
-                    trim_2[randomizer_10] += substract / 2
-                    if substract != 0:
-                        x_2 += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_8], substract / 2, ukuran[randomizer_9],
-                                                  substract / 2, ukuran[randomizer_10], substract / 2]])
-                    cut_2 += substract / 2
-                elif order_2[randomizer_8] / 2 < order_2[randomizer_10] <= order_2[randomizer_8] and order_2[
-                    randomizer_8] % 2 == 1:
-                    substract = max(order_2[randomizer_8], order_2[randomizer_10])
-                    order_2[randomizer_8] -= (substract - 1)
-                    trim_2[randomizer_8] += (substract - 1)
-                    order_2[randomizer_10] -= (substract - 1) / 2
-                    trim_2[randomizer_10] += (substract - 1) / 2
-                    if substract != 0 and substract != 1:
-                        x_2 += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_8], (substract - 1) / 2, ukuran[randomizer_9],
-                                                  (substract - 1) / 2, ukuran[randomizer_10], (substract - 1) / 2]])
-                    cut_2 += (substract - 1) / 2
-                elif order_2[randomizer_8] < order_2[randomizer_10] and order_2[randomizer_8] % 2 == 0:
-                    substract = min(order_2[randomizer_8], order_2[randomizer_10])
-                    order_2[randomizer_8] -= substract
-                    trim_2[randomizer_8] += substract
-                    order_2[randomizer_10] -= substract / 2
-                    trim_2[randomizer_10] += substract / 2
-                    if substract != 0:
-                        x_2 += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_8], substract / 2, ukuran[randomizer_9],
-                                                  substract / 2, ukuran[randomizer_10], substract / 2]])
-                    cut_2 += substract / 2
-                elif order_2[randomizer_8] < order_2[randomizer_10] and order_2[randomizer_8] % 2 == 1:
-                    substract = min(order_2[randomizer_8], order_2[randomizer_10])
-                    order_2[randomizer_8] -= (substract - 1)
-                    trim_2[randomizer_8] += (substract - 1)
-                    order_2[randomizer_10] -= (substract - 1) / 2
-                    trim_2[randomizer_10] += (substract - 1) / 2
-                    if substract != 0 and substract != 1:
-                        x_2 += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_8], (substract - 1) / 2, ukuran[randomizer_9],
-                                                  (substract - 1) / 2, ukuran[randomizer_10], (substract - 1) / 2]])
-                    cut_2 += (substract - 1) / 2
-            elif (lebar_3 - 12 <= ukuran[randomizer_8] + ukuran[randomizer_9] + ukuran[randomizer_10] <= lebar_3 and
-                  randomizer_8 == randomizer_9 and randomizer_8 == randomizer_10 and randomizer_10 == randomizer_9 and
-                  order_2[randomizer_8] > 0 and order_2[randomizer_9] > 0 and order_2[randomizer_10] > 0):
-                if order_2[randomizer_8] % 3 == 0:
-                    substract = min(order_2[randomizer_8], order_2[randomizer_9], order_2[randomizer_10])
-                    order_2[randomizer_8] -= substract
-                    trim_2[randomizer_8] += substract
-                    if substract != 0:
-                        x_2 += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_8], substract / 3, ukuran[randomizer_9],
-                                                  substract / 3, ukuran[randomizer_10], substract / 3]])
-                    cut_2 += substract / 3
-                elif order_2[randomizer_8] % 3 == 1:
-                    substract = min(order_2[randomizer_8], order_2[randomizer_9], order_2[randomizer_10])
-                    order_2[randomizer_8] -= (substract - 1)
-                    trim_2[randomizer_8] += (substract - 1)
-                    if substract != 0 and substract != 1:
-                        x_2 += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_8], (substract - 1) / 3, ukuran[randomizer_9],
-                                                  (substract - 1) / 3, ukuran[randomizer_10], (substract - 1) / 3]])
-                    cut_2 += (substract - 1) / 3
-                elif order_2[randomizer_8] % 3 == 2:
-                    substract = min(order_2[randomizer_8], order_2[randomizer_9], order_2[randomizer_10])
-                    order_2[randomizer_8] -= (substract - 2)
-                    trim_2[randomizer_8] += (substract - 2)
-                    if substract != 0 and substract != 2:
-                        x_2 += 1
-                        trim_detail = np.vstack([trim_detail,
-                                                 [ukuran[randomizer_8], (substract - 2) / 3, ukuran[randomizer_9],
-                                                  (substract - 2) / 3, ukuran[randomizer_10], (substract - 2) / 3]])
-                    cut_2 += (substract - 2) / 3
+                active_triples_2.drop_widths((randomizer_8, randomizer_9, randomizer_10), order_2)
 
         a[:, 3] = ukuran
         a[:, 4] = trim_2
@@ -670,41 +281,47 @@ def trimming_random(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id=None)
 
         ukuran_finaltrim_sisaorder = a
 
-        weight = np.sum(ukuran * order_2) * weight_constant
+        weight = np.sum(ukuran * order_2) * WEIGHT_CONSTANT
+        if info is not None:
+            info['iterations'] = z + 1
 
         # Early stopping condition 1: Check if all orders are processed
         if np.all(order_2 == 0):
             print(f"Early stop: All orders processed at iteration {z}")
-            return ukuran_finaltrim_sisaorder, weight, trim_detail, cut_1
+            return ukuran_finaltrim_sisaorder, weight, trim_detail.to_array(), cut_1
 
         # Store result if it's better than previous best
         if weight < best_results['weight']:
             best_results['weight'] = weight
-            best_results['details'] = trim_detail.copy()
-            best_results['ukuran_final'] = ukuran_finaltrim_sisaorder.copy()
+            best_results['details'] = trim_detail.to_array()
+            best_results['ukuran_final'] = ukuran_finaltrim_sisaorder
             best_results['cut_1'] = cut_1
             consecutive_same_results = 0  # Reset counter when we find a better result
+            _share_best(shared_best, weight)
         elif weight == best_results['weight']:
             # Check if the trim details are the same
-            if arrays_equal(trim_detail, last_detail):
+            if arrays_equal(trim_detail.view(), last_detail.view()):
                 consecutive_same_results += 1
                 if consecutive_same_results >= 5:
                     print(f"Early stop: 5 consecutive same results at iteration {z}")
-                    return (best_results['ukuran_final'],
-                            best_results['weight'],
-                            best_results['details'],
-                            best_results['cut_1'])
+                    return local_search((best_results['ukuran_final'],
+                                         best_results['weight'],
+                                         best_results['details'],
+                                         best_results['cut_1']),
+                                        orderan, ukuran, lebar_1, lebar_2, lebar_3,
+                                        time_budget=local_search_budget, substance_id=substance_id)
             else:
                 consecutive_same_results = 1
 
-        last_detail = trim_detail.copy()
-
         # Update best weight for current checkpoint
         if weight < current_checkpoint_best:
             current_checkpoint_best = weight
 
         # Checkpoint logic
         if (z + 1) % checkpoint_interval == 0:
+            # Multi-start workers judge the checkpoint on the best weight of all workers
+            if shared_best is not None:
+                current_checkpoint_best = min(current_checkpoint_best, shared_best.value)
             print(f"Checkpoint at iteration {z + 1}: Best weight = {current_checkpoint_best}")
             best_weights_history.append(current_checkpoint_best)
 
@@ -719,23 +336,20 @@ def trimming_random(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id=None)
                     break
 
             # Reset for next checkpoint
-            current_checkpoint_best = float('inf')
+            current_checkpoint_best = best_results['weight']
 
         # Update global best if needed
         if weight < weight_final:
             weight_final = weight
-            ukuran_finaltrim_sisaorder_final = ukuran_finaltrim_sisaorder.copy()
-            trim_detail_final = trim_detail.copy()
+            # `a` is allocated fresh every trial and the best rows were just finalized above,
+            # so both can be shared with best_results without another copy
+            ukuran_finaltrim_sisaorder_final = ukuran_finaltrim_sisaorder
+            trim_detail_final = best_results['details']
             cut_1_final = 0
         elif weight_final == weight and cut_1 > cut_1_final:
             cut_1_final = cut_1
-            ukuran_finaltrim_sisaorder_final = ukuran_finaltrim_sisaorder.copy()
-            trim_detail_final = trim_detail.copy()
-
-        # Keep track of last 5 results
-        last_five_results.append(trim_detail.copy())
-        if len(last_five_results) > 5:
-            last_five_results.pop(0)
+            ukuran_finaltrim_sisaorder_final = ukuran_finaltrim_sisaorder
+            trim_detail_final = trim_detail.to_array()
 
     # At the end of your trimming_random function, modify this part:
 
@@ -744,4 +358,87 @@ def trimming_random(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id=None)
         trim_detail_final = trim_detail_final[~np.all(trim_detail_final == 0, axis=1)]
     detail_trim_PM1_PM2 = trim_detail_final
 
-    return ukuran_finaltrim_sisaorder_final, weight_final, detail_trim_PM1_PM2, cut_1_final
\ No newline at end of file
+    return local_search((ukuran_finaltrim_sisaorder_final, weight_final, detail_trim_PM1_PM2, cut_1_final),
+                        orderan, ukuran, lebar_1, lebar_2, lebar_3,
+                        time_budget=local_search_budget, substance_id=substance_id)
+
+def _share_best(shared_best, weight):
+    """Lower the shared best weight of a multi-start search to `weight` if it is better"""
+    if shared_best is None or weight >= shared_best.value:
+        return
+    with shared_best.get_lock():
+        if weight < shared_best.value:
+            shared_best.value = weight
+
+
+# Best weight shared by the workers of one multi-start search, set by the pool initializer
+_shared_best = None
+
+
+def _init_multistart_worker(shared_best, generations, periodic_update_running):
+    global _shared_best
+    _shared_best = shared_best
+    attach_shared_state(generations, periodic_update_running)
+
+
+def _multistart_worker(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id, seed, warm_start, iterations,
+                       checkpoint_interval, token, anytime, time_budget, lower_bound):
+    # The worker carries on the parent's calculation, so a stop of the substance reaches it too
+    if token is not None:
+        trimming_state.adopt_processing(substance_id, token)
+    info = {}
+    result = trimming_random(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id, seed=seed,
+                             warm_start=warm_start, local_search_budget=0, iterations=iterations,
+                             shared_best=_shared_best, checkpoint_interval=checkpoint_interval,
+                             anytime=anytime, info=info, time_budget=time_budget, lower_bound=lower_bound)
+    return result, info
+
+
+def trimming_random_multistart(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id=None, seed=None,
+                               warm_start=None, local_search_budget=1.0, iterations=30000, workers=None,
+                               anytime=False, info=None, time_budget=None, lower_bound=None):
+    """
+        Split the trimming_random iterations across `workers` processes with independent seeds
+        The processes share their best weight, so each stops at the checkpoint criterion once the
+        search as a whole stops improving; the best plan is merged with the usual cut_1 tie-break
+        Falls back to a single process inside daemonic pool workers, which cannot start children
+        `anytime`, `info`, `time_budget` and `lower_bound` work as in trimming_random, with the iterations summed
+        over the processes
+        Returns (ukuran_finaltrim_sisaorder_final, weight_final, detail_trim_PM1_PM2, cut_1_final)
+    """
+    workers = workers or multiprocessing.cpu_count()
+    if workers <= 1 or multiprocessing.current_process().daemon:
+        return trimming_random(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id, seed=seed,
+                               warm_start=warm_start, local_search_budget=local_search_budget,
+                               iterations=iterations, anytime=anytime, info=info, time_budget=time_budget,
+                               lower_bound=lower_bound)
+
+    search_budget, local_search_budget = split_time_budget(time_budget, local_search_budget)
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    per_worker = -(-iterations // workers)
+    # Checkpoints come `workers` times as often per process, so they still span 2000 iterations in total
+    checkpoint_interval = max(1, 2000 // workers)
+    shared_best = multiprocessing.Value('d', float('inf'))
+    token = trimming_state.current_token(substance_id) if substance_id is not None else None
+    with multiprocessing.Pool(processes=workers, initializer=_init_multistart_worker,
+                              initargs=(shared_best, *trimming_state.shared())) as pool:
+        results = pool.starmap(_multistart_worker, [
+            (order, ukuran, lebar_1, lebar_2, lebar_3, substance_id, worker_seed, warm_start, per_worker,
+             checkpoint_interval, token, anytime, search_budget, lower_bound)
+            for worker_seed in seeds
+        ])
+
+    best = None
+    for result, _ in results:
+        best = better_result(best, result)
+    partial = any(worker_info.get('partial') for _, worker_info in results)
+    if info is not None:
+        info['partial'] = partial
+        info['iterations'] = sum(worker_info.get('iterations', 0) for _, worker_info in results)
+        info['truncated'] = any(worker_info.get('truncated') for _, worker_info in results)
+    if partial:
+        return interrupted_result(best, anytime)
+    if best is None or best[0] is None:
+        return None, None, None, None
+    return local_search(best, order, ukuran, lebar_1, lebar_2, lebar_3,
+                        time_budget=local_search_budget, substance_id=substance_id)
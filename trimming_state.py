@@ -1,36 +1,163 @@
+import multiprocessing
 import threading
-from typing import Set
+from typing import Dict, Optional, Tuple
+
+# Substance ids index the shared generation counters, so they must stay below this
+# (or below the capacity reserved with TrimmingState.reserve)
+MAX_SUBSTANCES = 1024
+
 
 class TrimmingState:
-    def __init__(self):
+    """
+        Processing state shared by the app threads and the pool worker processes.
+        Every substance has a generation counter in shared memory. A calculation remembers the
+        generation it started under and counts as cancelled once the counter moves on, so a stop
+        from the app reaches pool workers, which read the counter without taking a lock.
+    """
+
+    def __init__(self, capacity=MAX_SUBSTANCES):
         self._lock = threading.Lock()
-        self._processing_substances: Set[int] = set()
-        self._periodic_update_running = False
+        self._capacity = capacity
+        # Created on first use, so importing this module does not fix the multiprocessing start method
+        self._generations = None
+        self._periodic_update_running = None
+        # substance_id -> (generation, batch) of the calculations running in this process
+        self._tokens: Dict[int, Tuple[int, bool]] = {}
+
+    def shared(self):
+        """Shared-memory objects to hand to attach_shared_state in a pool initializer"""
+        if self._generations is None:
+            with self._lock:
+                if self._generations is None:
+                    self._periodic_update_running = multiprocessing.Value('b', 0)
+                    self._generations = multiprocessing.Array('q', self._capacity)
+        return self._generations, self._periodic_update_running
 
-    def start_processing(self, substance_id: int) -> None:
+    def reserve(self, capacity: int) -> None:
+        """Track at least `capacity` substance ids; only possible before the shared counters exist"""
         with self._lock:
-            self._processing_substances.add(substance_id)
+            if capacity > self._capacity and self._generations is not None:
+                raise RuntimeError("The shared substance counters already exist and cannot grow")
+            self._capacity = max(self._capacity, capacity)
 
-    def stop_processing(self, substance_id: int) -> None:
+    def attach(self, generations, periodic_update_running) -> None:
+        self._generations = generations
+        self._periodic_update_running = periodic_update_running
+        self._capacity = len(generations)
+
+    def _slot(self, substance_id) -> int:
+        """Counter index of a substance id; ValueError for ids that are not numbers or not tracked"""
+        slot = int(substance_id)
+        if not 0 <= slot < self._capacity:
+            raise ValueError(f"Substance id {substance_id} is outside the {self._capacity} tracked ids")
+        return slot
+
+    def start_processing(self, substance_id: int, batch: bool = False) -> Tuple[int, bool]:
+        """
+            Register a calculation for a substance in this process and return its token.
+            Batch calculations keep running while the periodic update flag is up.
+        """
+        slot = self._slot(substance_id)
+        generations, _ = self.shared()
+        with self._lock:
+            token = (generations.get_obj()[slot], batch)
+            self._tokens[slot] = token
+            return token
+
+    def adopt_processing(self, substance_id: int, token: Tuple[int, bool]) -> None:
+        """Continue a calculation started in another process (e.g. a multi-start worker)"""
+        with self._lock:
+            self._tokens[self._slot(substance_id)] = token
+
+    def current_token(self, substance_id: int) -> Optional[Tuple[int, bool]]:
+        with self._lock:
+            return self._tokens.get(self._slot(substance_id))
+
+    def finish_processing(self, substance_id: int, token: Tuple[int, bool]) -> None:
+        """Drop the calculation registered with `token`, leaving any newer one for the substance alone"""
+        slot = self._slot(substance_id)
         with self._lock:
-            self._processing_substances.discard(substance_id)
+            if self._tokens.get(slot) == token:
+                del self._tokens[slot]
 
-    def is_processing(self, substance_id: int) -> bool:
+    def stop_processing(self, substance_id: int) -> None:
+        """Cancel the calculations of a substance in every process"""
+        slot = self._slot(substance_id)
+        generations, _ = self.shared()
+        with generations.get_lock():
+            generations[slot] += 1
         with self._lock:
-            return substance_id in self._processing_substances
+            self._tokens.pop(slot, None)
+
+    def is_processing(self, substance_id: Optional[int]) -> bool:
+        if substance_id is None:
+            return False
+        slot = self._slot(substance_id)
+        token = self._tokens.get(slot)
+        return token is not None and self.shared()[0].get_obj()[slot] == token[0]
+
+    def is_cancelled(self, substance_id: Optional[int]) -> bool:
+        """True when the calculation of a substance should stop; calculations without an id never do"""
+        if substance_id is None:
+            return False
+        slot = self._slot(substance_id)
+        token = self._tokens.get(slot)
+        generations, periodic_update_running = self.shared()
+        if token is None or generations.get_obj()[slot] != token[0]:
+            return True
+        return not token[1] and periodic_update_running.get_obj().value != 0
+
+    def cancellation_token(self, substance_id: Optional[int]) -> 'CancellationToken':
+        """Snapshot the current calculation of a substance as a token for hot loops"""
+        if substance_id is None:
+            return CancellationToken(None, None, None, None)
+        slot = self._slot(substance_id)
+        generations, periodic_update_running = self.shared()
+        return CancellationToken(slot, self._tokens.get(slot), generations.get_obj(),
+                                 periodic_update_running.get_obj())
 
     def stop_all_processing(self) -> None:
+        generations, periodic_update_running = self.shared()
+        with generations.get_lock():
+            counters = generations.get_obj()
+            for substance_id in range(len(counters)):
+                counters[substance_id] += 1
         with self._lock:
-            self._processing_substances.clear()
-            self._periodic_update_running = True
+            self._tokens.clear()
+            periodic_update_running.value = 1
 
     def finish_periodic_update(self) -> None:
-        with self._lock:
-            self._periodic_update_running = False
+        self.shared()[1].value = 0
 
     def is_periodic_update_running(self) -> bool:
-        with self._lock:
-            return self._periodic_update_running
+        return self.shared()[1].get_obj().value != 0
+
+
+class CancellationToken:
+    """
+        Cancellation state of one calculation, read straight from shared memory.
+        Unlike TrimmingState.is_cancelled it does no dict lookups or locking, so it costs about
+        as much as an attribute read; calculations without a substance id are never cancelled.
+    """
+
+    def __init__(self, substance_id, token, counters, periodic_update_running):
+        self._substance_id = substance_id
+        self._generation, self._batch = token if token is not None else (None, False)
+        self._counters = counters
+        self._periodic_update_running = periodic_update_running
+
+    def cancelled(self) -> bool:
+        if self._substance_id is None:
+            return False
+        if self._generation is None or self._counters[self._substance_id] != self._generation:
+            return True
+        return not self._batch and self._periodic_update_running.value != 0
+
 
 # Create global instance
-trimming_state = TrimmingState()
\ No newline at end of file
+trimming_state = TrimmingState()
+
+
+def attach_shared_state(generations, periodic_update_running):
+    """Pool initializer: make this worker's trimming_state use the parent's shared memory"""
+    trimming_state.attach(generations, periodic_update_running)
@@ -0,0 +1,180 @@
+import time
+
+import numpy as np
+from trimming_random import check_interruption
+from trimming_bound import meets_bound
+from trimming_greedy import trimming_greedy
+from trimming_local_search import local_search, split_time_budget
+from trimming_patterns import (better_result, draw_indices, feasible_pairs, feasible_triples, interrupted_result,
+                               pair_divisors, TRIPLE_DIVISORS, WEIGHT_CONSTANT)
+
+
+# Steps between checks of whether a phase can still cut anything in any trial
+PHASE_CHECK_STEPS = 32
+
+
+def _any_active(orders, patterns, divisors):
+    """Whether any trial in the (M, widths) order state still has the rolls for one cut of any pattern"""
+    return bool((orders[:, patterns] >= divisors).all(axis=2).any())
+
+
+def _apply_phase(orders, patterns, divisors, picks):
+    """
+        Apply one random phase to every trial at once.
+        orders is the (M, widths) order state, picks the (M, steps) pattern draws.
+        Each step cuts min(order // divisor) of the drawn pattern in every trial.
+        The phase ends early once a run of PHASE_CHECK_STEPS steps cut nothing and no trial
+        has a pattern left to cut, as the remaining draws could not change the order state.
+        Returns the (M, steps done) number of cuts made per step.
+    """
+    trials, steps = picks.shape
+    counts = np.zeros((trials, steps), dtype=orders.dtype)
+    if steps == 0:
+        return counts
+
+    rows = np.arange(trials)
+    slots = patterns.shape[1]
+    step_patterns = patterns[picks]
+    step_divisors = divisors[picks]
+    for step in range(steps):
+        index = step_patterns[:, step]
+        divisor = step_divisors[:, step]
+        substract = orders[rows, index[:, 0]] // divisor[:, 0]
+        for slot in range(1, slots):
+            np.minimum(substract, orders[rows, index[:, slot]] // divisor[:, slot], out=substract)
+        # Slots are subtracted one at a time so a repeated width loses one roll per slot
+        for slot in range(slots):
+            orders[rows, index[:, slot]] -= substract
+        counts[:, step] = substract
+        done = step + 1
+        if done % PHASE_CHECK_STEPS == 0 and not counts[:, done - PHASE_CHECK_STEPS:done].any() \
+                and not _any_active(orders, patterns, divisors):
+            return counts[:, :done]
+    return counts
+
+
+def _trial_detail(ukuran, phases, trial):
+    """Rebuild the (n, 6) trim detail of one trial from its recorded draws and cut counts"""
+    rows = []
+    for patterns, picks, counts in phases:
+        for pick, substract in zip(picks[trial], counts[trial]):
+            if substract == 0:
+                continue
+            row = [0] * 6
+            for slot, index in enumerate(patterns[pick]):
+                row[2 * slot] = ukuran[index]
+                row[2 * slot + 1] = substract
+            rows.append(row)
+    return np.array(rows, dtype=float).reshape(-1, 6)
+
+
+def trimming_vectorized(order, ukuran, lebar_1, lebar_2, lebar_3, substance_id=None, seed=None,
+                        warm_start=None, trials=30000, batch_size=250, local_search_budget=1.0,
+                        anytime=False, info=None, time_budget=None, lower_bound=None):
+    """
+        Vectorized Monte Carlo trimming: simulates `batch_size` random trials at once as
+        (trials x widths) arrays, using the same phases as trimming_random
+        Options work as in trimming_random, with trials counted as iterations
+        Returns (ukuran_finaltrim_sisaorder_final, weight_final, detail_trim_PM1_PM2, cut_1_final)
+    """
+    ukuran = np.asarray(ukuran)
+    orderan = np.asarray(order).astype(np.int64)
+    rng = np.random.default_rng(seed)
+
+    # Every phase is a list of index patterns plus the per-slot divisors of each pattern
+    pairs_1 = feasible_pairs(ukuran, lebar_1)
+    pairs_2 = feasible_pairs(ukuran, lebar_2)
+    triples_1, classes_1 = feasible_triples(ukuran, lebar_1)
+    triples_2, classes_2 = feasible_triples(ukuran, lebar_3)
+    pm1_phases = [
+        (pairs_1, pair_divisors(pairs_1)),
+        (triples_1, TRIPLE_DIVISORS[classes_1]),
+    ]
+    pm2_phases = [
+        (pairs_2, pair_divisors(pairs_2)),
+        (triples_2, TRIPLE_DIVISORS[classes_2]),
+    ]
+
+    best = better_result(trimming_greedy(orderan, ukuran, lebar_1, lebar_2, lebar_3), warm_start)
+    best_weight = best[1]
+    best_cut_1 = best[3]
+
+    # Variables for weight checkpoint optimization; windows start from the seeded best
+    checkpoint_interval = 2000
+    best_weights_history = []
+    current_checkpoint_best = best_weight
+
+    search_budget, local_search_budget = split_time_budget(time_budget, local_search_budget)
+    stop_at = time.monotonic() + search_budget if search_budget is not None else None
+
+    done = 0
+    if info is not None:
+        info.update(partial=False, iterations=0, truncated=False)
+    while done < trials:
+        if check_interruption(substance_id):
+            print(f"Trimming calculation interrupted for substance {substance_id}")
+            return interrupted_result(best, anytime, info)
+        if stop_at is not None and time.monotonic() >= stop_at:
+            print(f"Time budget reached after {done} trials")
+            if info is not None:
+                info['truncated'] = True
+            break
+        if meets_bound(best_weight, lower_bound):
+            print(f"Early stop: best weight {best_weight} meets the lower bound after {done} trials")
+            break
+
+        batch = min(batch_size, trials - done)
+        orders = np.tile(orderan, (batch, 1))
+
+        phases = []
+        for patterns, divisors in pm1_phases:
+            picks = draw_indices(rng, len(patterns), (batch, 1000)).reshape(batch, -1)
+            counts = _apply_phase(orders, patterns, divisors, picks)
+            phases.append((patterns, picks[:, :counts.shape[1]], counts))
+        orders_pm1 = orders.copy()
+        for patterns, divisors in pm2_phases:
+            picks = draw_indices(rng, len(patterns), (batch, 1000)).reshape(batch, -1)
+            counts = _apply_phase(orders, patterns, divisors, picks)
+            phases.append((patterns, picks[:, :counts.shape[1]], counts))
+
+        weights = (orders @ ukuran) * WEIGHT_CONSTANT
+        cuts_1 = phases[0][2].sum(axis=1) + phases[1][2].sum(axis=1)
+
+        # Lowest weight first, most PM1 cuts on ties
+        trial = np.lexsort((-cuts_1, weights))[0]
+        weight = weights[trial]
+        if weight < best_weight or (weight == best_weight and cuts_1[trial] > best_cut_1):
+            best_weight = weight
+            best_cut_1 = cuts_1[trial]
+            a = np.zeros((len(orderan), 6))
+            a[:, 0] = ukuran
+            a[:, 1] = orderan - orders_pm1[trial]
+            a[:, 2] = orders_pm1[trial]
+            a[:, 3] = ukuran
+            a[:, 4] = orderan - orders[trial]
+            a[:, 5] = orders[trial]
+            best = (a, best_weight, _trial_detail(ukuran, phases, trial), best_cut_1)
+
+        done += batch
+        if info is not None:
+            info['iterations'] = done
+
+        # Early stopping condition: all orders processed
+        if not orders[trial].any():
+            print(f"Early stop: All orders processed after {done} trials")
+            break
+
+        # Checkpoint logic, evaluated on batch boundaries
+        current_checkpoint_best = min(current_checkpoint_best, weight)
+        if done % checkpoint_interval < batch:
+            print(f"Checkpoint at trial {done}: Best weight = {current_checkpoint_best}")
+            best_weights_history.append(current_checkpoint_best)
+            if len(best_weights_history) >= 3 and any(
+                    abs(w - current_checkpoint_best) < 0.0001 for w in best_weights_history[:-1]):
+                print(f"Early stop: Found matching best weight (within tolerance) {current_checkpoint_best} "
+                      f"in previous checkpoints")
+                break
+            current_checkpoint_best = best_weight
+
+    return local_search(best, orderan, ukuran, lebar_1, lebar_2, lebar_3,
+                        time_budget=local_search_budget, substance_id=substance_id)